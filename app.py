@@ -1,16 +1,173 @@
-from flask import Flask, request, jsonify, send_from_directory, Response
+import time
+_BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_from_directory, Response, g
 from flask_cors import CORS
-from highlight import save_detected_highlight, remove_highlight, get_highlights
-from highlighter import detect_highlights
+from highlight import save_detected_highlight, remove_highlight, get_highlights, is_junk
+from highlighter import detect_highlights, iter_highlights_by_page, page_image_path
 from pyqs import get_pyq_matches
+from image_derivatives import DERIVED_DIR, MANIFEST_FILE, page_sources
+from single_flight import SingleFlight
+from page_boxes import boxes_path, load_boxes
+import date_index
+import chapter_cache
 import traceback
 import os
 import json
+import queue
+import threading
+import cProfile
+import pstats
+import io
+import hmac
+import random
+import re
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__, static_url_path='/static', static_folder='static')
 CORS(app, resources={r"/api/": {"origins": "*"}}, supports_credentials=True)
 
+BOOT_IMPORT_MS = (time.perf_counter() - _BOOT_STARTED) * 1000
+print(f"[BOOT] app imported in {BOOT_IMPORT_MS:.1f} ms")
+
+# ────────────────────────────────────────────────
+# On-demand request profiling
+#   PROFILE_SAMPLE_RATE  fraction of /api requests to profile (default 0)
+#   PROFILE_TOKEN        requests sending X-Profile-Token: <token> are always
+#                        profiled; the same header unlocks /api/admin/profiles
+#   PROFILE_DIR          where .prof files and their .json metadata go
+#   PROFILE_MAX_FILES    oldest profiles beyond this are deleted
+# ────────────────────────────────────────────────
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")  # never under static/
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+
+# Only one request per worker is profiled at a time; overlapping
+# profilers would also measure each other.
+_profile_slot = threading.Lock()
+
+def _has_profile_token():
+    sent = request.headers.get("X-Profile-Token", "")
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(sent, PROFILE_TOKEN)
+
+@app.before_request
+def start_profiling():
+    if not request.path.startswith("/api/") or request.path.startswith("/api/admin/"):
+        return
+    forced = _has_profile_token()
+    if not forced and (PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE):
+        return
+    if not _profile_slot.acquire(blocking=False):
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this interpreter
+        _profile_slot.release()
+        return
+    g.profiler = profiler
+    g.profile_started = time.perf_counter()
+    g.profile_reason = "header" if forced else "sampled"
+
+@app.after_request
+def stop_profiling(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    try:
+        profiler.disable()
+        _write_profile(profiler, response)
+    except Exception:
+        print("[EXCEPTION] stop_profiling:", traceback.format_exc())
+    finally:
+        _profile_slot.release()
+    return response
+
+def _write_profile(profiler, response):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    duration_ms = (time.perf_counter() - g.profile_started) * 1000
+    endpoint = secure_filename(request.endpoint or "unknown")
+    name = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{random.randint(0, 0xffff):04x}"
+
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.prof"))
+    meta = {
+        "name": name,
+        "endpoint": request.endpoint,
+        "method": request.method,
+        "path": request.path,
+        "args": request.args.to_dict(),
+        "status": response.status_code,
+        "duration_ms": round(duration_ms, 1),
+        "reason": g.profile_reason,
+        "pid": os.getpid(),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"[PROFILE] {request.method} {request.path} ({duration_ms:.0f} ms) → {name}.prof")
+    _prune_profiles()
+
+def _prune_profiles():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+    if len(metas) <= PROFILE_MAX_FILES:
+        return
+    metas.sort(key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)))
+    for meta in metas[:len(metas) - PROFILE_MAX_FILES]:
+        base = os.path.splitext(meta)[0]
+        for ext in (".json", ".prof"):
+            path = os.path.join(PROFILE_DIR, base + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+# List captured profiles (newest first)
+@app.route('/api/admin/profiles')
+def list_profiles():
+    if not _has_profile_token():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        profiles = []
+        if os.path.isdir(PROFILE_DIR):
+            for file in os.listdir(PROFILE_DIR):
+                if file.endswith(".json"):
+                    with open(os.path.join(PROFILE_DIR, file), "r", encoding="utf-8") as f:
+                        profiles.append(json.load(f))
+        endpoint = request.args.get('endpoint')
+        if endpoint:
+            profiles = [p for p in profiles if p.get('endpoint') == endpoint]
+        profiles.sort(key=lambda p: p.get('created_at', 0), reverse=True)
+        return jsonify({'profiles': profiles}), 200
+    except Exception:
+        print("[EXCEPTION] list_profiles:", traceback.format_exc())
+        return jsonify({'error': 'Internal error'}), 500
+
+# Download one profile (.prof for snakeviz/pstats, or ?format=text for a summary)
+@app.route('/api/admin/profiles/<name>')
+def download_profile(name):
+    if not _has_profile_token():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        name = secure_filename(name)
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        if not os.path.exists(path):
+            return jsonify({'error': 'Profile not found'}), 404
+
+        if request.args.get('format') == 'text':
+            out = io.StringIO()
+            stats = pstats.Stats(path, stream=out)
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'ncalls', 'filename'):
+                sort = 'cumulative'
+            stats.sort_stats(sort).print_stats(50)
+            return Response(out.getvalue(), mimetype="text/plain")
+
+        return send_from_directory(PROFILE_DIR, f"{name}.prof", as_attachment=True)
+    except Exception:
+        print("[EXCEPTION] download_profile:", traceback.format_exc())
+        return jsonify({'error': 'Internal error'}), 500
+
 # Health check
 @app.route("/health")
 def health():
@@ -22,6 +179,31 @@ JUNK_WORDS = {
     "is", "are", "was", "by", "from", "this", "that"
 }
 
+# Coalesce identical concurrent requests (a whole class opening one chapter)
+chapter_flight = SingleFlight("load_chapter")
+highlight_flight = SingleFlight("highlight", cross_process=True)
+
+def _build_chapter_pages(book, chapter, folder_path):
+    manifest = chapter_cache.read_json(
+        os.path.join(folder_path, DERIVED_DIR, MANIFEST_FILE), default={}
+    )
+
+    pages = []
+    for file in sorted(os.listdir(folder_path)):
+        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image_url = f"/static/books/{book}/{chapter}/{file}"
+            text_file = os.path.splitext(file)[0] + ".txt"
+            text_path = os.path.join(folder_path, text_file)
+            text_content = ""
+            if os.path.exists(text_path):
+                text_content = chapter_cache.read_text(text_path)
+            else:
+                print(f"⚠ Missing text file for: {text_file}")
+            page = {"image": image_url, "text": text_content}
+            page.update(page_sources(f"/static/books/{book}/{chapter}", manifest.get(file)))
+            pages.append(page)
+    return pages
+
 # Load chapter (images + text)
 @app.route('/api/load_chapter', methods=['POST'])
 def load_chapter():
@@ -36,19 +218,9 @@ def load_chapter():
         if not os.path.exists(folder_path):
             return jsonify({'error': 'Chapter folder not found'}), 404
 
-        pages = []
-        for file in sorted(os.listdir(folder_path)):
-            if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                image_url = f"/static/books/{book}/{chapter}/{file}"
-                text_file = os.path.splitext(file)[0] + ".txt"
-                text_path = os.path.join(folder_path, text_file)
-                text_content = ""
-                if os.path.exists(text_path):
-                    with open(text_path, "r", encoding="utf-8") as f:
-                        text_content = f.read()
-                else:
-                    print(f"⚠ Missing text file for: {text_file}")
-                pages.append({"image": image_url, "text": text_content})
+        pages = chapter_flight.do(
+            (book, chapter), lambda: _build_chapter_pages(book, chapter, folder_path)
+        )
 
         return jsonify({'pages': pages}), 200
     except Exception:
@@ -75,23 +247,70 @@ def get_chapter_highlights(book, chapter):
     try:
         page_number = request.args.get('page_number')
         category = request.args.get('category')
+        # Optional character range, e.g. the viewer's visible region
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
 
-        highlights = get_highlights(book, chapter)
-        print(f"[GET HIGHLIGHTS] Loaded {len(highlights)} highlights")
+        if page_number is not None and not page_number.lstrip('-').isdigit():
+            return jsonify({'error': 'Invalid page_number'}), 400
 
-        if page_number is not None:
-            highlights = [h for h in highlights if str(h.get('page_number')) == str(page_number)]
-            print(f"  Filtered by page_number={page_number}: {len(highlights)}")
-
-        if category:
-            highlights = [h for h in highlights if h.get('category') == category]
-            print(f"  Filtered by category='{category}': {len(highlights)}")
+        highlights = get_highlights(
+            book, chapter, page_number=page_number, category=category or None,
+            start=start, end=end
+        )
+        print(f"[GET HIGHLIGHTS] page_number={page_number}, category='{category}', "
+              f"range=({start}, {end}): {len(highlights)} highlights")
 
         return jsonify({"highlights": highlights}), 200
     except Exception:
         print("[EXCEPTION] get_chapter_highlights:", traceback.format_exc())
         return jsonify({'error': 'Internal error'}), 500
 
+def _run_auto_highlight(book, chapter, category, page, fuzzy=False):
+    # Persistence happens below via highlight.py, in its own format
+    matches = detect_highlights(book, chapter, categories=[category], page=page, persist=False, fuzzy=fuzzy)
+    print(f"[AUTO-HIGHLIGHT] {len(matches)} matches detected for category '{category}'")
+
+    valid_count = _save_matches(book, chapter, category, matches)
+
+    highlights = get_highlights(book, chapter)
+    print(f"[HIGHLIGHT AUTO] Total highlights after saving: {len(highlights)}")
+    return {"valid_count": valid_count, "highlights": highlights}
+
+def _is_savable(match):
+    # Same checks for /api/highlight and the stream, so clients never see unsaved matches
+    highlight_text = match.get('text', '').strip()
+    if not highlight_text or match.get('start') is None or match.get('end') is None:
+        print(f"⚠ Skipping invalid match (missing data): {match}")
+        return False
+
+    if highlight_text.lower() in JUNK_WORDS or len(highlight_text.split()) < 2 or is_junk(highlight_text):
+        print(f"⚠ Skipped junk/short highlight: '{highlight_text}'")
+        return False
+    return True
+
+def _save_matches(book, chapter, category, matches):
+    valid_count = 0
+    for match in matches:
+        if not _is_savable(match):
+            continue
+
+        highlight_text = match.get('text', '').strip()
+        start = match.get('start')
+        end = match.get('end')
+        page_number = match.get('page_number', 0)
+        match_id = match.get("match_id")
+        rule_name = match.get("rule_name")
+        source = match.get("source", "rule")
+
+        print(f"[SAVE HIGHLIGHT] '{highlight_text}' from page {page_number}")
+        save_detected_highlight(
+            book, chapter, highlight_text, start, end,
+            category, page_number, match_id, rule_name, source
+        )
+        valid_count += 1
+    return valid_count
+
 # Auto-highlight (date + pyq)
 @app.route('/api/highlight', methods=['POST'])
 def highlight_auto():
@@ -101,6 +320,7 @@ def highlight_auto():
         chapter = data.get('chapter')
         category = data.get('category')
         page = data.get('page')
+        fuzzy = bool(data.get('fuzzy', False))
 
         if not all([book, chapter, category]):
             print("[WARNING] Missing book, chapter, or category")
@@ -109,36 +329,11 @@ def highlight_auto():
         if category not in ["date", "pyq"]:
             return jsonify({'message': 'Only "date" and "pyq" categories allowed'}), 400
 
-        matches = detect_highlights(book, chapter, categories=[category], page=page)
-        print(f"[AUTO-HIGHLIGHT] {len(matches)} matches detected for category '{category}'")
-
-        valid_count = 0
-        for match in matches:
-            highlight_text = match.get('text', '').strip()
-            start = match.get('start')
-            end = match.get('end')
-            page_number = match.get('page_number', 0)
-            match_id = match.get("match_id")
-            rule_name = match.get("rule_name")
-            source = match.get("source", "rule")
-
-            if not highlight_text or start is None or end is None:
-                print(f"⚠ Skipping invalid match (missing data): {match}")
-                continue
-
-            if highlight_text.lower() in JUNK_WORDS or len(highlight_text.split()) < 2:
-                print(f"⚠ Skipped junk/short highlight: '{highlight_text}'")
-                continue
-
-            print(f"[SAVE HIGHLIGHT] '{highlight_text}' from page {page_number}")
-            save_detected_highlight(
-                book, chapter, highlight_text, start, end,
-                category, page_number, match_id, rule_name, source
-            )
-            valid_count += 1
-
-        highlights = get_highlights(book, chapter)
-        print(f"[HIGHLIGHT AUTO] Total highlights after saving: {len(highlights)}")
+        result = highlight_flight.do(
+            (book, chapter, category, page, fuzzy),
+            lambda: _run_auto_highlight(book, chapter, category, page, fuzzy)
+        )
+        valid_count, highlights = result["valid_count"], result["highlights"]
 
         return jsonify({
             'message': f"{valid_count} valid highlight(s) saved",
@@ -148,6 +343,77 @@ def highlight_auto():
         print("[EXCEPTION] highlight_auto:", traceback.format_exc())
         return jsonify({'error': 'Internal error'}), 500
 
+def _persist_stream(book, chapter, category, pending):
+    saved = 0
+    while True:
+        matches = pending.get()
+        if matches is None:
+            break
+        try:
+            saved += _save_matches(book, chapter, category, matches)
+        except Exception:
+            print("[EXCEPTION] _persist_stream:", traceback.format_exc())
+    print(f"[HIGHLIGHT STREAM] {saved} highlight(s) saved in background")
+
+# Auto-highlight, streamed page by page (SSE, or NDJSON with format=ndjson)
+@app.route('/api/highlight_stream', methods=['GET', 'POST'])
+def highlight_stream():
+    try:
+        # GET (query args) so browsers can use EventSource; POST JSON also works
+        data = request.get_json(silent=True) or request.args
+        book = data.get('book')
+        chapter = data.get('chapter')
+        category = data.get('category')
+        page = data.get('page')
+        fuzzy = str(data.get('fuzzy', '')).lower() in ('1', 'true', 'yes')
+        accept = request.headers.get('Accept', '')
+        ndjson = data.get('format') == 'ndjson' or 'application/x-ndjson' in accept
+
+        if not all([book, chapter, category]):
+            return jsonify({'error': 'Missing book, chapter, or category'}), 400
+
+        if category not in ["date", "pyq"]:
+            return jsonify({'message': 'Only "date" and "pyq" categories allowed'}), 400
+
+        # Saving runs on its own thread so events aren't held up by disk writes
+        pending = queue.Queue()
+        threading.Thread(
+            target=_persist_stream, args=(book, chapter, category, pending), daemon=True
+        ).start()
+
+        def encode(event, payload):
+            if ndjson:
+                return json.dumps(dict(payload, event=event), ensure_ascii=False) + "\n"
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        def generate():
+            pages = total = 0
+            try:
+                for page_number, matches in iter_highlights_by_page(
+                    book, chapter, categories=[category], page=page, fuzzy=fuzzy
+                ):
+                    matches = [m for m in matches if _is_savable(m)]
+                    pending.put(matches)
+                    pages += 1
+                    total += len(matches)
+                    print(f"[HIGHLIGHT STREAM] Page {page_number}: {len(matches)} matches")
+                    yield encode("page", {"page_number": page_number, "highlights": matches})
+                yield encode("done", {"pages": pages, "matches": total})
+            except Exception:
+                print("[EXCEPTION] highlight_stream:", traceback.format_exc())
+                yield encode("error", {"error": "Internal error"})
+            finally:
+                pending.put(None)
+
+        return Response(
+            generate(),
+            mimetype="application/x-ndjson" if ndjson else "text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except Exception:
+        print("[EXCEPTION] highlight_stream:", traceback.format_exc())
+        return jsonify({'error': 'Internal error'}), 500
+
 # Remove highlight
 @app.route('/api/remove_highlight', methods=['POST'])
 def unhighlight_line():
@@ -172,13 +438,92 @@ def unhighlight_line():
         print("[EXCEPTION] unhighlight_line:", traceback.format_exc())
         return jsonify({'error': 'Internal error'}), 500
 
+# Pixel boxes for highlights (from OCR word boxes written at ingest)
+@app.route('/api/highlight_boxes', methods=['POST'])
+def highlight_boxes():
+    try:
+        data = request.json
+        book = data.get('book')
+        chapter = data.get('chapter')
+        items = data.get('highlights', [])
+
+        if not all([book, chapter]):
+            return jsonify({'error': 'Missing book or chapter'}), 400
+
+        if not isinstance(items, list):
+            return jsonify({'error': 'highlights must be a list'}), 400
+
+        folder_path = os.path.join("static", "books", book, chapter)
+        results = []
+        pages = {}
+        missing = set()
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({'rects': [], 'error': 'Invalid highlight'})
+                continue
+            try:
+                page_number = int(item.get('page_number', 0))
+                start, end = int(item['start']), int(item['end'])
+            except (KeyError, TypeError, ValueError):
+                results.append({**item, 'rects': [], 'error': 'Invalid highlight'})
+                continue
+
+            # page_number follows the sorted image listing (page10 sorts before page2)
+            image_path = page_image_path(folder_path, page_number)
+            boxes = load_boxes(boxes_path(image_path)) if image_path else None
+            if boxes is None:
+                missing.add(page_number)
+                results.append({'page_number': page_number, 'start': start, 'end': end, 'rects': []})
+                continue
+
+            pages[page_number] = {'width': boxes.width, 'height': boxes.height}
+            results.append({
+                'page_number': page_number, 'start': start, 'end': end,
+                'rects': boxes.rects_for(start, end)
+            })
+
+        print(f"[HIGHLIGHT BOXES] {len(results)} highlights, {len(missing)} pages without boxes")
+        return jsonify({'boxes': results, 'pages': pages, 'missing_pages': sorted(missing)}), 200
+    except Exception:
+        print("[EXCEPTION] highlight_boxes:", traceback.format_exc())
+        return jsonify({'error': 'Internal error'}), 500
+
+# Timeline query over the ingest-time date index
+ISO_DATE = re.compile(r'^\d{4}(-\d{2}(-\d{2})?)?$')
+
+@app.route('/api/dates')
+def query_dates():
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        book = request.args.get('book')
+        chapter = request.args.get('chapter')
+
+        for value in (date_from, date_to):
+            if value and not ISO_DATE.match(value):
+                return jsonify({'error': 'Dates must be YYYY, YYYY-MM or YYYY-MM-DD'}), 400
+
+        index = date_index.load_index()
+        if index is None:
+            return jsonify({'error': 'Date index not built'}), 503
+
+        try:
+            dates = index.query(date_from, date_to, book=book, chapter=chapter)
+        except ValueError:
+            return jsonify({'error': 'Invalid date'}), 400
+        print(f"[DATES] from={date_from} to={date_to} book={book} chapter={chapter}: {len(dates)} dates")
+        return jsonify({'dates': dates}), 200
+    except Exception:
+        print("[EXCEPTION] query_dates:", traceback.format_exc())
+        return jsonify({'error': 'Internal error'}), 500
+
 # PYQ matching
 @app.route('/api/pyq_match', methods=['POST'])
 def pyq_match():
     try:
         data = request.json
         chapter_text = data.get('chapter_text', "")
-        matches = get_pyq_matches(chapter_text)
+        matches = get_pyq_matches(chapter_text, fuzzy=bool(data.get('fuzzy', False)))
 
         print(f"[PYQ MATCH] Found {len(matches)} PYQs")
 
@@ -245,11 +590,24 @@ def serve_static_image(book, chapter, filename):
         print("[EXCEPTION] serve_static_image:", traceback.format_exc())
         return "Error loading image", 500
 
+# Serve resized page derivatives (generated at ingest by image_derivatives.py)
+@app.route(f'/static/books/<book>/<chapter>/{DERIVED_DIR}/<filename>')
+def serve_derived_image(book, chapter, filename):
+    try:
+        safe_filename = secure_filename(filename)
+        return send_from_directory(
+            f'static/books/{book}/{chapter}/{DERIVED_DIR}', safe_filename,
+            max_age=60 * 60 * 24 * 7
+        )
+    except Exception:
+        print("[EXCEPTION] serve_derived_image:", traceback.format_exc())
+        return "Error loading image", 500
+
 # Global CORS headers
 @app.after_request
 def add_cors_headers(response):
     response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type,Authorization"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type,Authorization,X-Profile-Token"
     response.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
     return response
 
@@ -257,4 +615,5 @@ def add_cors_headers(response):
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 10000))
     print(f"\n[SERVER START] Running at http://0.0.0.0:{port}")
-    app.run(host="0.0.0.0", port=port, debug=True)
+    debug = os.environ.get("FLASK_DEBUG", "0") == "1"
+    app.run(host="0.0.0.0", port=port, debug=debug)
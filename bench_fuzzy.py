@@ -0,0 +1,121 @@
+"""
+Benchmark for fuzzy PYQ matching (fuzzy_match.PhraseIndex).
+
+Builds pages of growing size from the chapter text in static/books,
+injects OCR-style character errors, and times the n-gram index search
+against a naive scan (bounded edit distance of every phrase over the
+whole page). The index should stay close to linear in page size.
+
+    python bench_fuzzy.py [--phrases 200] [--repeat 3]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from fuzzy_match import build_index, bounded_edit_search, max_edits
+
+BOOKS_ROOT = os.path.join("static", "books")
+OCR_CONFUSIONS = {"o": "0", "l": "1", "i": "l", "e": "c", "s": "5", "rn": "m", "t": "f"}
+
+
+def _corpus():
+    chunks = []
+    for root, _, files in os.walk(BOOKS_ROOT):
+        for name in sorted(files):
+            if name.endswith(".txt"):
+                with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                    chunks.append(f.read())
+    text = "\n".join(chunks)
+    if not text.strip():
+        sys.exit("No page text found under static/books")
+    return text
+
+
+def _add_ocr_noise(text, rng, rate=0.01):
+    out = []
+    i = 0
+    while i < len(text):
+        if rng.random() < rate:
+            for src, dst in OCR_CONFUSIONS.items():
+                if text.startswith(src, i):
+                    out.append(dst)
+                    i += len(src)
+                    break
+            else:
+                out.append(text[i])
+                i += 1
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def _build_page(corpus, rng, size, chunk=1000):
+    # Random slices keep the phrase density the same at every size
+    parts = []
+    while sum(len(p) for p in parts) < size:
+        start = rng.randrange(0, max(1, len(corpus) - chunk))
+        parts.append(corpus[start:start + chunk])
+    return "".join(parts)[:size]
+
+
+def _sample_phrases(text, rng, count):
+    words = text.split()
+    phrases = set()
+    while len(phrases) < count:
+        start = rng.randrange(0, max(1, len(words) - 6))
+        phrases.add(" ".join(words[start:start + rng.randint(2, 5)]))
+    return sorted(phrases)
+
+
+def _naive(phrases, page):
+    hits = 0
+    folded = page.lower()
+    for phrase in phrases:
+        p = phrase.lower()
+        if bounded_edit_search(p, folded, 0, len(folded), max_edits(len(p))) is not None:
+            hits += 1
+    return hits
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--phrases", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = _corpus()
+    phrases = _sample_phrases(corpus, rng, args.phrases)
+
+    started = time.perf_counter()
+    index = build_index(phrases)
+    print(f"Indexed {len(phrases)} phrases in {(time.perf_counter() - started) * 1000:.1f} ms\n")
+
+    print(f"{'page chars':>10} | {'index ms':>9} | {'µs/char':>7} | {'matches':>7} | {'naive ms':>9}")
+    print("-" * 56)
+    for size in (2_000, 4_000, 8_000, 16_000, 32_000, 64_000):
+        page = _add_ocr_noise(_build_page(corpus, rng, size), rng)
+
+        index_s, matches = _time(lambda: index.search(page), args.repeat)
+        naive = "-"
+        if size <= 4_000:
+            naive_s, _ = _time(lambda: _naive(phrases, page), 1)
+            naive = f"{naive_s * 1000:9.1f}"
+        print(f"{size:>10} | {index_s * 1000:9.1f} | {index_s * 1e6 / size:7.2f} | {len(matches):>7} | {naive:>9}")
+
+
+if __name__ == "__main__":
+    main()
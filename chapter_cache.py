@@ -0,0 +1,124 @@
+import os
+import json
+import threading
+
+# ────────────────────────────────────────────────
+# In-process cache for read-only chapter assets
+# (page text, PYQ JSON). Entries are keyed by path
+# and invalidated when the file's mtime changes, so
+# edits on disk are picked up without a restart.
+# ────────────────────────────────────────────────
+BOOKS_ROOT = os.path.join("static", "books")
+PYQ_ROOT = os.path.join("static", "pyq")
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def read_text(path):
+    """Return the contents of a UTF-8 text file, cached until it changes."""
+    mtime = _mtime(path)
+    if mtime is None:
+        raise FileNotFoundError(path)
+
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    with _lock:
+        _cache[path] = (mtime, text)
+    return text
+
+
+def read_json(path, default=None):
+    """Return parsed JSON from ``path`` (or ``default`` if missing/invalid), cached until it changes."""
+    mtime = _mtime(path)
+    if mtime is None:
+        return default
+
+    key = ("json", path)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[CACHE] Failed to parse JSON {path}: {e}")
+        return default
+
+    with _lock:
+        _cache[key] = (mtime, data)
+    return data
+
+
+def read_parsed(path, parser):
+    """Return ``parser(raw_bytes)`` for a binary file (None if missing/invalid), cached until it changes."""
+    mtime = _mtime(path)
+    if mtime is None:
+        return None
+
+    key = ("parsed", parser.__name__, path)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(path, "rb") as f:
+            value = parser(f.read())
+    except Exception as e:
+        print(f"[CACHE] Failed to parse {path}: {e}")
+        return None
+
+    with _lock:
+        _cache[key] = (mtime, value)
+    return value
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def warm_chapter(book, chapter):
+    """Load every page text and the PYQ file of one chapter into the cache."""
+    folder_path = os.path.join(BOOKS_ROOT, book, chapter)
+    count = 0
+    for file in sorted(os.listdir(folder_path)):
+        if file.lower().endswith(".txt"):
+            read_text(os.path.join(folder_path, file))
+            count += 1
+    read_json(os.path.join(PYQ_ROOT, book, f"{chapter}.json"))
+    return count
+
+
+def warm_all():
+    """Prime the cache for every chapter under ``static/books``. Returns (chapters, pages)."""
+    chapters = pages = 0
+    if not os.path.isdir(BOOKS_ROOT):
+        return chapters, pages
+
+    for book in sorted(os.listdir(BOOKS_ROOT)):
+        book_path = os.path.join(BOOKS_ROOT, book)
+        if not os.path.isdir(book_path):
+            continue
+        for chapter in sorted(os.listdir(book_path)):
+            if not os.path.isdir(os.path.join(book_path, chapter)):
+                continue
+            try:
+                pages += warm_chapter(book, chapter)
+                chapters += 1
+            except Exception as e:
+                print(f"[CACHE] Warmup failed for {book}/{chapter}: {e}")
+    return chapters, pages
@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import json
+import time
+import calendar
+from bisect import bisect_left, bisect_right
+from datetime import date
+import chapter_cache
+from highlighter import COMPILED_RULES, list_chapter_images
+
+# ────────────────────────────────────────────────
+# Corpus-wide date index.
+# At ingest every RULES["date"] match is parsed into a normalised
+# date with a precision (day / month / year) and posted under its
+# year and year-month. Range queries then bisect the sorted year
+# keys instead of re-running the regexes over every chapter.
+# ────────────────────────────────────────────────
+BOOKS_ROOT = os.path.join("static", "books")
+INDEX_PATH = os.path.join("static", "index", "dates.json")
+INDEX_VERSION = 1
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+
+_DAY_MONTH_YEAR = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]+)\.?\s+(\d{4})')
+_MONTH_DAY_YEAR = re.compile(r'([A-Za-z]+)\.?\s*(\d{1,2}),?\s+(\d{4})')
+_NUMERIC = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})')
+_YEAR = re.compile(r'(\d{4})')
+
+# Entry field order in the index file (kept as lists to stay compact)
+FIELDS = ("book", "chapter", "page_number", "start", "end", "text", "date", "precision")
+
+
+def _expand_year(y):
+    """Four-digit years as-is, two-digit ones expanded; anything else is None."""
+    if len(y) == 4:
+        return int(y)
+    if len(y) != 2:
+        return None
+    # Two-digit years: 00-30 → 2000s, otherwise 1900s
+    y = int(y)
+    return 2000 + y if y <= 30 else 1900 + y
+
+
+def _valid(y, m, d):
+    try:
+        date(y, m, d)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_date(text):
+    """
+    Normalise a matched date string. Returns (iso, precision) where iso is
+    'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' and precision is 'year', 'month' or
+    'day', or None if the text isn't a usable date.
+    """
+    t = text.strip()
+
+    m = _DAY_MONTH_YEAR.fullmatch(t)
+    if m:
+        day, month, year = int(m.group(1)), MONTHS.get(m.group(2).lower()), int(m.group(3))
+        if month and _valid(year, month, day):
+            return f"{year:04d}-{month:02d}-{day:02d}", "day"
+        return None
+
+    m = _MONTH_DAY_YEAR.fullmatch(t)
+    if m:
+        month, day, year = MONTHS.get(m.group(1).lower()), int(m.group(2)), int(m.group(3))
+        if month and _valid(year, month, day):
+            return f"{year:04d}-{month:02d}-{day:02d}", "day"
+        return None
+
+    m = _NUMERIC.fullmatch(t)
+    if m:
+        # NCERT texts use day/month/year
+        day, month, year = int(m.group(1)), int(m.group(2)), _expand_year(m.group(3))
+        if year is not None and _valid(year, month, day):
+            return f"{year:04d}-{month:02d}-{day:02d}", "day"
+        return None
+
+    m = _YEAR.fullmatch(t)
+    if m:
+        return f"{int(m.group(1)):04d}", "year"
+    return None
+
+
+def _bounds(iso):
+    """
+    (first_day, last_day) tuples covered by an ISO date of any precision.
+    Raises ValueError for an impossible date (e.g. month 13 or day 00).
+    """
+    parts = [int(p) for p in iso.split("-")]
+    if len(parts) == 1:
+        date(parts[0], 1, 1)
+        return (parts[0], 1, 1), (parts[0], 12, 31)
+    if len(parts) == 2:
+        y, m = parts
+        date(y, m, 1)
+        return (y, m, 1), (y, m, calendar.monthrange(y, m)[1])
+    date(*parts)
+    return tuple(parts), tuple(parts)
+
+
+def extract_dates(page_text):
+    """
+    Parsed date matches on one page, most precise first: a bare year
+    inside an already-matched full date is dropped.
+    """
+    spans = []
+    for _, regex in COMPILED_RULES["date"]:
+        for match in regex.finditer(page_text):
+            parsed = parse_date(match.group())
+            if parsed:
+                spans.append((match.start(), match.end(), match.group().strip(), parsed))
+
+    # Longest spans win; anything inside an accepted span is a sub-match
+    spans.sort(key=lambda s: (-(s[1] - s[0]), s[0]))
+    accepted = []
+    for start, end, text, parsed in spans:
+        if any(a[0] <= start and end <= a[1] for a in accepted):
+            continue
+        accepted.append((start, end, text, parsed))
+    accepted.sort()
+    return accepted
+
+
+def _chapter_pages(folder_path):
+    """(page_number, txt_path) numbered like highlighter, without the MAX_IMAGES cap."""
+    for idx, img in enumerate(list_chapter_images(folder_path)):
+        txt_path = os.path.join(folder_path, os.path.splitext(img)[0] + ".txt")
+        if os.path.exists(txt_path):
+            yield idx + 1, txt_path
+
+
+def build_index(books_root=BOOKS_ROOT, index_path=INDEX_PATH):
+    """Scan every chapter, write the date index file and return its entry count."""
+    started = time.perf_counter()
+    entries = []
+    years = {}
+    months = {}
+
+    for book in sorted(os.listdir(books_root)):
+        book_path = os.path.join(books_root, book)
+        if not os.path.isdir(book_path):
+            continue
+        for chapter in sorted(os.listdir(book_path)):
+            folder_path = os.path.join(book_path, chapter)
+            if not os.path.isdir(folder_path):
+                continue
+            for page_number, txt_path in _chapter_pages(folder_path):
+                page_text = chapter_cache.read_text(txt_path)
+                for start, end, text, (iso, precision) in extract_dates(page_text):
+                    entry_id = len(entries)
+                    entries.append([book, chapter, page_number, start, end, text, iso, precision])
+                    years.setdefault(iso[:4], []).append(entry_id)
+                    if precision != "year":
+                        months.setdefault(iso[:7], []).append(entry_id)
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "built_at": time.time(),
+            "fields": FIELDS,
+            "entries": entries,
+            "years": years,
+            "months": months,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"[DATE INDEX] {len(entries)} dates in {len(years)} years → {index_path} ({elapsed:.0f} ms)")
+    return len(entries)
+
+
+class DateIndex:
+    def __init__(self, data):
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported date index version: {data.get('version')}")
+        self.entries = data["entries"]
+        self.years = data["years"]
+        self.months = data["months"]
+        self._year_keys = sorted(int(y) for y in self.years)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def query(self, date_from=None, date_to=None, book=None, chapter=None):
+        """
+        Entries whose date overlaps [date_from, date_to] (ISO strings of any
+        precision; either end may be open), sorted by date then location.
+        """
+        lo = _bounds(date_from)[0] if date_from else (0, 1, 1)
+        hi = _bounds(date_to)[1] if date_to else (9999, 12, 31)
+
+        first = bisect_left(self._year_keys, lo[0])
+        last = bisect_right(self._year_keys, hi[0])
+
+        results = []
+        for year in self._year_keys[first:last]:
+            # Narrow single-month queries with the month postings
+            if lo[:2] == hi[:2] and year == lo[0]:
+                ids = self.months.get(f"{year:04d}-{lo[1]:02d}", []) + [
+                    i for i in self.years[str(year)] if self.entries[i][7] == "year"
+                ]
+            else:
+                ids = self.years[str(year)]
+            for i in ids:
+                e = self.entries[i]
+                if book and e[0] != book:
+                    continue
+                if chapter and e[1] != chapter:
+                    continue
+                e_lo, e_hi = _bounds(e[6])
+                if e_hi < lo or e_lo > hi:
+                    continue
+                results.append(dict(zip(FIELDS, e)))
+
+        results.sort(key=lambda r: (r["date"], r["book"], r["chapter"], r["page_number"], r["start"]))
+        return results
+
+
+def _parse_index(raw):
+    return DateIndex(json.loads(raw.decode("utf-8")))
+
+
+def load_index(index_path=INDEX_PATH):
+    """Cached DateIndex, or None if the index hasn't been built."""
+    return chapter_cache.read_parsed(index_path, _parse_index)
+
+
+if __name__ == "__main__":
+    # python date_index.py            → rebuild static/index/dates.json
+    # python date_index.py 1940 1950  → rebuild, then print that range
+    build_index()
+    if len(sys.argv) > 1:
+        index = load_index()
+        for row in index.query(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else sys.argv[1]):
+            print(f"{row['date']:<10} {row['book']}/{row['chapter']} p{row['page_number']}: {row['text']}")
@@ -0,0 +1,170 @@
+from functools import lru_cache
+
+# ────────────────────────────────────────────────
+# Fuzzy phrase matching over OCR-noisy page text.
+#   1. Index every phrase by its character trigrams.
+#   2. Slide over the page once; each page trigram votes for
+#      (phrase, alignment) pairs that share it. By the q-gram
+#      lemma a window within k edits of a phrase of length m
+#      shares at least (m - 2) - 3k trigrams with it, so only
+#      alignments with that many votes are kept.
+#   3. Verify each candidate window with a bounded edit distance.
+# Work is proportional to page length × trigram fan-out, not to
+# page length × number of phrases.
+# ────────────────────────────────────────────────
+Q = 3
+MAX_ERROR_RATIO = 0.15   # allowed edits as a fraction of phrase length
+MIN_FUZZY_LENGTH = 6     # shorter phrases must match exactly
+
+
+def _fold(text):
+    """Lower-case without changing string length, so offsets stay valid."""
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def max_edits(length, ratio=MAX_ERROR_RATIO):
+    if length < MIN_FUZZY_LENGTH:
+        return 0
+    return max(1, int(length * ratio))
+
+
+class PhraseIndex:
+    def __init__(self, phrases, ratio=MAX_ERROR_RATIO):
+        self.phrases = [p for p in phrases if p and p.strip()]
+        self.ratio = ratio
+        self._folded = [_fold(p) for p in self.phrases]
+        # trigram -> [(phrase id, offset of trigram inside phrase)]
+        self._postings = {}
+        # Phrases shorter than Q have no trigrams; they are matched with a plain find
+        self._short = []
+        for pid, phrase in enumerate(self._folded):
+            if len(phrase) < Q:
+                self._short.append(pid)
+                continue
+            for offset in range(len(phrase) - Q + 1):
+                self._postings.setdefault(phrase[offset:offset + Q], []).append((pid, offset))
+
+    def candidates(self, text):
+        """(phrase id, approximate start in text) pairs worth verifying."""
+        votes = {}
+        for pos in range(len(text) - Q + 1):
+            postings = self._postings.get(text[pos:pos + Q])
+            if not postings:
+                continue
+            for pid, offset in postings:
+                key = (pid, pos - offset)
+                votes[key] = votes.get(key, 0) + 1
+
+        # Neighbouring diagonals belong to the same occurrence once
+        # insertions/deletions shift the alignment; pool them per phrase.
+        by_phrase = {}
+        for (pid, diag), count in votes.items():
+            by_phrase.setdefault(pid, []).append((diag, count))
+
+        found = []
+        for pid, diags in by_phrase.items():
+            m = len(self._folded[pid])
+            k = max_edits(m, self.ratio)
+            needed = max(1, (m - Q + 1) - Q * k)
+            diags.sort()
+            i = 0
+            while i < len(diags):
+                # Group diagonals within k of each other
+                j, total = i, 0
+                while j < len(diags) and diags[j][0] - diags[i][0] <= k:
+                    total += diags[j][1]
+                    j += 1
+                if total >= needed:
+                    best = max(diags[i:j], key=lambda d: d[1])[0]
+                    found.append((pid, best))
+                    i = j
+                else:
+                    i += 1
+        return found
+
+    def search(self, text, min_score=0.0):
+        """
+        Scored matches of indexed phrases in ``text``:
+        [{"phrase", "text", "start", "end", "distance", "score"}], by start offset.
+        """
+        folded = _fold(text)
+        matches = []
+        taken = set()
+        candidates = self.candidates(folded)
+        for pid in self._short:
+            pos = folded.find(self._folded[pid])
+            while pos != -1:
+                candidates.append((pid, pos))
+                pos = folded.find(self._folded[pid], pos + 1)
+        for pid, diag in candidates:
+            phrase = self._folded[pid]
+            m = len(phrase)
+            k = max_edits(m, self.ratio)
+            if diag >= 0 and folded.startswith(phrase, diag):
+                hit = (0, diag, diag + m)  # exact hit, no DP needed
+            else:
+                lo = max(0, diag - k)
+                hi = min(len(folded), diag + m + k)
+                hit = bounded_edit_search(phrase, folded, lo, hi, k)
+            if hit is None:
+                continue
+            distance, start, end = hit
+            if (pid, start) in taken:
+                continue
+            taken.add((pid, start))
+            score = 1.0 - distance / float(m)
+            if score < min_score:
+                continue
+            matches.append({
+                "phrase": self.phrases[pid],
+                "text": text[start:end],
+                "start": start,
+                "end": end,
+                "distance": distance,
+                "score": round(score, 3),
+            })
+        matches.sort(key=lambda h: (h["start"], -h["score"]))
+        return matches
+
+
+def bounded_edit_search(pattern, text, lo, hi, k):
+    """
+    Best approximate occurrence of ``pattern`` in text[lo:hi] with at most
+    ``k`` edits (Sellers' algorithm: free start and end in the text).
+    Returns (distance, start, end) or None.
+    """
+    m = len(pattern)
+    # cost[i] / start[i]: best alignment of pattern[:i] ending at the current column
+    prev_cost = list(range(m + 1))
+    prev_start = [lo] * (m + 1)
+    best = (m, lo, lo) if m <= k else None
+
+    for j in range(lo, hi):
+        c = text[j]
+        cost = [0]
+        start = [j + 1]
+        for i in range(1, m + 1):
+            best_cost = prev_cost[i - 1] + (pattern[i - 1] != c)
+            best_start = prev_start[i - 1]
+            up = cost[i - 1] + 1
+            if up < best_cost or (up == best_cost and start[i - 1] < best_start):
+                best_cost, best_start = up, start[i - 1]
+            left = prev_cost[i] + 1
+            if left < best_cost or (left == best_cost and prev_start[i] < best_start):
+                best_cost, best_start = left, prev_start[i]
+            cost.append(best_cost)
+            start.append(best_start)
+        if cost[m] <= k and (best is None or cost[m] < best[0]):
+            best = (cost[m], start[m], j + 1)
+        prev_cost, prev_start = cost, start
+    return best
+
+
+@lru_cache(maxsize=64)
+def _cached_index(phrases, ratio):
+    return PhraseIndex(phrases, ratio)
+
+
+def build_index(phrases, ratio=MAX_ERROR_RATIO):
+    """Shared PhraseIndex for a list of phrases (cached by content)."""
+    return _cached_index(tuple(phrases), ratio)
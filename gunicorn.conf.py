@@ -0,0 +1,85 @@
+import math
+import multiprocessing
+import os
+import time
+
+# ────────────────────────────────────────────────
+# Production server profile
+#   gunicorn -c gunicorn.conf.py app:app
+# Every value can be overridden from the environment.
+# ────────────────────────────────────────────────
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# Detection is mostly file I/O + regex, so threaded workers keep
+# a slow /api/highlight from blocking page and image requests.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+
+def _cgroup_cpu_limit():
+    """CPU quota of the container (cgroup v2 or v1), or None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _available_cpus():
+    # cpu_count() reports the host; containers are limited by affinity and quota
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = multiprocessing.cpu_count()
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return cpus
+
+
+_cpus = _available_cpus()
+_max_workers = int(os.environ.get("GUNICORN_MAX_WORKERS", "4"))
+workers = int(os.environ.get("WEB_CONCURRENCY", min(2 * _cpus + 1, _max_workers)))
+
+# Load the app (compiled rules, cached PYQ data) once in the
+# master; forked workers share those pages copy-on-write.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# Whole-chapter detection can take a while on cold disks.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then so a leaky request can't grow RSS forever.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server):
+    """Prime chapter caches in the master before workers are forked."""
+    if os.environ.get("GUNICORN_WARMUP", "1") != "1":
+        return
+    import chapter_cache
+
+    started = time.perf_counter()
+    chapters, pages = chapter_cache.warm_all()
+    elapsed = (time.perf_counter() - started) * 1000
+    server.log.info(f"[WARMUP] Cached {pages} pages from {chapters} chapters in {elapsed:.1f} ms")
@@ -1,6 +1,13 @@
 import json
 import os
 import re
+import threading
+from interval_index import ChapterHighlightIndex
+
+# Per-chapter interval indexes, keyed by file path and invalidated
+# whenever the file changes on disk (e.g. written by another worker)
+_index_cache = {}
+_index_lock = threading.RLock()
 
 # 🔧 Path builder for chapter  
 def get_chapter_file_path(book, chapter):
@@ -17,6 +24,9 @@ def load_data(book, chapter):
         try:
             with open(path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+                # highlight_store writes {"highlights": [...]}; accept both layouts
+                if isinstance(data, dict):
+                    data = data.get("highlights", [])
                 print(f"✅ Loaded {len(data)} highlights.")
                 return data
         except Exception as e:
@@ -34,8 +44,40 @@ def save_data(book, chapter, highlights):
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(highlights, f, indent=2, ensure_ascii=False)
             print(f"💾 Saved {len(highlights)} highlights to {path}")
+        return True
     except Exception as e:
         print(f"❌ Error saving highlights: {e}")
+        return False
+
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+# 🗂️ Load (or reuse) the interval index for a chapter
+def load_index(book, chapter):
+    path = get_chapter_file_path(book, chapter)
+    version = _file_version(path)
+    with _index_lock:
+        cached = _index_cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        index = ChapterHighlightIndex(load_data(book, chapter))
+        _index_cache[path] = (version, index)
+        return index
+
+
+def _save_index(book, chapter, index):
+    path = get_chapter_file_path(book, chapter)
+    if save_data(book, chapter, index.to_list()):
+        _index_cache[path] = (_file_version(path), index)
+    else:
+        # Index no longer matches the file; rebuild on next access
+        _index_cache.pop(path, None)
 
 
 # 🚫 Junk detector function (updated to allow 4-digit years)
@@ -61,7 +103,6 @@ def is_junk(text):
 # 🖍️ Save one detected highlight (with metadata)  
 def save_detected_highlight(book, chapter, text, start, end, category, page_number, match_id=None, rule_name=None, source=None):
     print(f"\n🖍️ Saving highlight → Book: {book}, Chapter: {chapter}, Page: {page_number}, Category: {category}")
-    highlights = load_data(book, chapter)
 
     if is_junk(text):
         print(f"🚫 Skipped junk highlight: '{text}'")
@@ -87,51 +128,64 @@ def save_detected_highlight(book, chapter, text, start, end, category, page_numb
     if source is not None:
         entry["source"] = source
 
-    if entry not in highlights:
-        highlights.append(entry)
-        save_data(book, chapter, highlights)
+    with _index_lock:
+        index = load_index(book, chapter)
+        stored = index.page(entry["page_number"], create=True).insert(entry)
+        if stored is None:
+            print(f"ℹ️ Highlight already exists or is covered: '{text}'")
+            return
+        _save_index(book, chapter, index)
+
+    if stored is entry:
         print(f"✅ Highlight added: '{text}'")
     else:
-        print(f"ℹ️ Highlight already exists: '{text}'")
+        print(f"🔗 Highlight merged with overlapping span → '{stored['text']}'")
 
 
 # 🧽 Remove a highlight  
 def remove_highlight(book, chapter, text, start, end, category, page_number):
     print(f"\n🧽 Removing highlight → Book: {book}, Chapter: {chapter}, Page: {page_number}, Category: {category}")
-    highlights = load_data(book, chapter)
-
-    target = {
-        "text": text.strip(),
-        "start": int(start),
-        "end": int(end),
-        "category": category.strip(),
-        "page_number": int(page_number)
-    }
+    with _index_lock:
+        index = load_index(book, chapter)
+        page = index.page(page_number)
+        found = page.find(int(start), int(end), text.strip(), category.strip()) if page else None
 
-    new_highlights = [h for h in highlights if not (
-        h.get("text") == target["text"] and
-        h.get("start") == target["start"] and
-        h.get("end") == target["end"] and
-        h.get("category") == target["category"] and
-        h.get("page_number") == target["page_number"]
-    )]
-
-    if len(new_highlights) < len(highlights):
-        save_data(book, chapter, new_highlights)
-        print("✅ Highlight removed.")
-    else:
-        print("⚠️ Highlight not found, skipping.")
+        if found is not None:
+            page.remove(found)
+            _save_index(book, chapter, index)
+            print("✅ Highlight removed.")
+        else:
+            print("⚠️ Highlight not found, skipping.")
 
 
-# 📌 Get all highlights (with optional filters)  
-def get_highlights(book, chapter, page_number=None, category=None):
+# 📌 Get all highlights (with optional page / range / category filters)  
+def get_highlights(book, chapter, page_number=None, category=None, start=None, end=None):
     print(f"\n📌 Fetching highlights → Book: {book}, Chapter: {chapter}, Page: {page_number}, Category: {category}")
-    highlights = load_data(book, chapter)
+    index = load_index(book, chapter)
+
+    ranged = start is not None or end is not None
+    lo = int(start) if start is not None else 0
+    hi = int(end) if end is not None else float("inf")
 
     if page_number is not None:
-        page_number = int(page_number)
-        highlights = [h for h in highlights if h.get("page_number") == page_number]
-        print(f"📄 Filtered by page → {len(highlights)} items")
+        page = index.page(page_number)
+        pages = [page] if page else []
+    else:
+        pages = None
+
+    # Reads take no lock: page indexes are copy-on-write snapshots
+    if pages is None and not ranged:
+        highlights = index.to_list()
+    else:
+        if pages is None:
+            pages = index.pages()
+        highlights = []
+        for page in pages:
+            highlights.extend(page.overlapping(lo, hi) if ranged else page)
+        # Legacy entries without offsets can't match a range, but still belong to their page
+        if not ranged:
+            highlights.extend(index.unindexed(page_number))
+        print(f"📄 Filtered by page/range → {len(highlights)} items")
 
     if category is not None:
         highlights = [h for h in highlights if h.get("category") == category]
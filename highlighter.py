@@ -1,7 +1,8 @@
 import os  
 import re  
 import json  
-import inflect  
+import chapter_cache  
+from fuzzy_match import build_index  
 
 # ────────────────────────────────────────────────  
 # Config  
@@ -9,8 +10,6 @@ import inflect
 MAX_IMAGES = 5  
 DEBUG_CONTEXT_CHARS = 40  # chars around match for context  
 
-inflector = inflect.engine()  
-
 SAVE_ENABLED = False  
 try:  
     from highlight_store import save_detected_highlight  # noqa: F401  
@@ -30,11 +29,20 @@ RULES = {
     ]  
 }  
 
+# Compiled once at import so preloaded workers share them  
+COMPILED_RULES = {  
+    category: [(pattern, re.compile(pattern)) for pattern in patterns]  
+    for category, patterns in RULES.items()  
+}  
+
 CATEGORY_ALIASES = {  
     "date": "date",  
     "dates": "date",  
     "pyq": "pyq",  
-    "pyqs": "pyq"  
+    "pyqs": "pyq",  
+    "pyq's": "pyq",  
+    "previous year question": "pyq",  
+    "previous year questions": "pyq"  
 }  
 
 # ────────────────────────────────────────────────  
@@ -73,13 +81,22 @@ def normalize_category(cat: str) -> str:
     if not cat:  
         return ""  
     base = cat.strip().lower()  
-    singular = inflector.singular_noun(base) or base  
-    norm = CATEGORY_ALIASES.get(singular, singular)  
-    return norm  
+    return CATEGORY_ALIASES.get(base, base)  
+
+def list_chapter_images(folder_path: str):  
+    """Page images in page_number order: page_number N is images[N - 1]."""  
+    return sorted([f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])  
+
+def page_image_path(folder_path: str, page_number: int):  
+    """Image behind a highlight's page_number, or None if there is no such page."""  
+    images = list_chapter_images(folder_path) if os.path.isdir(folder_path) else []  
+    if not 1 <= int(page_number) <= len(images):  
+        return None  
+    return os.path.join(folder_path, images[int(page_number) - 1])  
 
 def _list_chapter_pages(folder_path: str):  
     pages_to_scan = []  
-    images = sorted([f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])  
+    images = list_chapter_images(folder_path)  
     for idx, img in enumerate(images[:MAX_IMAGES]):  
         txt_file = os.path.splitext(img)[0] + ".txt"  
         txt_path = os.path.join(folder_path, txt_file)  
@@ -99,8 +116,9 @@ def _load_pyq(book: str, chapter: str):
         print(f"[WARN] PYQ file not found: {file_path}")  
         return []  
     try:  
-        with open(file_path, "r", encoding="utf-8") as f:  
-            data = json.load(f)  
+        data = chapter_cache.read_json(file_path)  
+        if data is None:  
+            raise ValueError("invalid JSON")  
         print(f"[DEBUG PYQ LOAD] Loaded {len(data.get('pyq', []))} PYQs from {file_path}")  
         return data.get("pyq", [])  
     except Exception as e:  
@@ -110,23 +128,23 @@ def _load_pyq(book: str, chapter: str):
 # ────────────────────────────────────────────────  
 # Core highlighter  
 # ────────────────────────────────────────────────  
-def highlight_by_keywords(book: str, chapter: str, categories=None, page=None):  
+def iter_highlights_by_page(book: str, chapter: str, categories=None, page=None, fuzzy: bool = False):  
+    """Generator form of highlight_by_keywords: yields (page_number, highlights) as each page is scanned."""  
     folder_path = os.path.join("static", "books", book.strip(), chapter.strip())  
     if not os.path.isdir(folder_path):  
         print(f"[ERROR] Directory not found: {folder_path}")  
-        return []  
+        return  
 
     normalized = [normalize_category(c) for c in (categories or [])]  
-    active_rules = {k: RULES[k] for k in normalized if k in RULES}  
+    active_rules = {k: COMPILED_RULES[k] for k in normalized if k in COMPILED_RULES}  
     do_pyq = "pyq" in normalized  
 
     if not active_rules and not do_pyq:  
         print("[DEBUG] No active rules or PYQ configured for highlighting.")  
-        return []  
+        return  
 
     pages_to_scan = _list_chapter_pages(folder_path) if not page else [(int(page), os.path.join(folder_path, f"{page}.txt"))]  
 
-    highlights = []  
     seen_texts = set()  
 
     for page_number, txt_path in pages_to_scan:  
@@ -134,14 +152,14 @@ def highlight_by_keywords(book: str, chapter: str, categories=None, page=None):
             print(f"[DEBUG SKIP PAGE] Text file not found: {txt_path}")  
             continue  
 
-        with open(txt_path, "r", encoding="utf-8") as f:  
-            page_text = f.read()  
+        page_text = chapter_cache.read_text(txt_path)  
+        highlights = []  
 
         # Regex matches  
         for category, patterns in active_rules.items():  
-            for pattern in patterns:  
+            for pattern, regex in patterns:  
                 print(f"[DEBUG PATTERN] Applying pattern: {pattern}")  
-                for match in re.finditer(pattern, page_text):  
+                for match in regex.finditer(page_text):  
                     matched_text = match.group().strip()  
                     print(f"[DEBUG MATCH] Found candidate '{matched_text}' for category '{category}' on page {page_number}")  
 
@@ -167,8 +185,31 @@ def highlight_by_keywords(book: str, chapter: str, categories=None, page=None):
                         "end": match.end()  
                     })  
 
+        # Fuzzy PYQ matches (tolerates OCR typos via the n-gram index)  
+        if do_pyq and fuzzy:  
+            pyq_index = build_index(_load_pyq(book, chapter))  
+            for m in pyq_index.search(page_text):  
+                key = f"{m['phrase']}|pyq|{page_number}"  
+                if key in seen_texts:  
+                    print(f"[DEBUG SKIP DUPLICATE PYQ] Already seen: {m['phrase']}")  
+                    continue  
+
+                seen_texts.add(key)  
+                print(f"[DEBUG PYQ FUZZY] '{m['phrase']}' ~ '{m['text']}' (score {m['score']}) on page {page_number}")  
+
+                highlights.append({  
+                    "text": m["text"],  
+                    "category": "pyq",  
+                    "page_number": page_number,  
+                    "source": "pyq-fuzzy",  
+                    "start": m["start"],  
+                    "end": m["end"],  
+                    "pyq": m["phrase"],  
+                    "score": m["score"]  
+                })  
+
         # PYQ matches  
-        if do_pyq:  
+        elif do_pyq:  
             pyq_list = _load_pyq(book, chapter)  
             for q in pyq_list:  
                 index = page_text.lower().find(q.lower())  
@@ -195,19 +236,26 @@ def highlight_by_keywords(book: str, chapter: str, categories=None, page=None):
                 else:  
                     print(f"[DEBUG PYQ NOT FOUND] '{q}' not found in page {page_number}")  
 
+        yield page_number, highlights  
+
+def highlight_by_keywords(book: str, chapter: str, categories=None, page=None, fuzzy: bool = False):  
+    highlights = []  
+    for _, page_highlights in iter_highlights_by_page(book, chapter, categories=categories, page=page, fuzzy=fuzzy):  
+        highlights.extend(page_highlights)  
+
     print(f"[DEBUG FINAL RESULT] Highlights found: {highlights}")  
     return highlights  
 
 # ────────────────────────────────────────────────  
 # Public API  
 # ────────────────────────────────────────────────  
-def detect_highlights(book: str, chapter: str, categories=None, page=None, persist: bool = True):  
+def detect_highlights(book: str, chapter: str, categories=None, page=None, persist: bool = True, fuzzy: bool = False):  
     if isinstance(categories, str):  
         categories = [categories]  
 
     print(f"[DEBUG API CALL] Detect highlights called with book='{book}', chapter='{chapter}', categories={categories}, page={page}, persist={persist}")  
 
-    result = highlight_by_keywords(book, chapter, categories=categories, page=page)  
+    result = highlight_by_keywords(book, chapter, categories=categories, page=page, fuzzy=fuzzy)  
 
     if SAVE_ENABLED and persist:  
         for h in result:  
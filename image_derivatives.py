@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+
+# ────────────────────────────────────────────────
+# Ingest-time image derivatives for chapter pages.
+# For every pageN.jpg we write resized WebP/JPEG copies and a
+# thumbnail into <chapter>/derived/, plus a manifest.json that
+# load_chapter turns into srcset-style URL maps.
+# ────────────────────────────────────────────────
+DERIVED_DIR = "derived"
+MANIFEST_FILE = "manifest.json"
+
+WIDTHS = (480, 960, 1440)
+THUMB_WIDTH = 200
+FORMATS = {
+    # format key: (PIL format, extension, save options)
+    "webp": ("WEBP", "webp", {"quality": 75, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+
+def derived_folder(folder_path):
+    return os.path.join(folder_path, DERIVED_DIR)
+
+
+def _supported_formats():
+    from PIL import features
+    formats = dict(FORMATS)
+    if not features.check("webp"):
+        print("[DERIVE] Pillow built without WebP support, writing JPEG only")
+        formats.pop("webp")
+    return formats
+
+
+def _is_fresh(src_path, dst_path):
+    return os.path.exists(dst_path) and os.path.getmtime(dst_path) >= os.path.getmtime(src_path)
+
+
+def _save_resized(image, width, dst_path, pil_format, options):
+    from ocr_engine import RESAMPLE
+
+    w, h = image.size
+    if width < w:
+        image = image.resize((width, max(1, round(h * width / w))), RESAMPLE)
+    image.save(dst_path, pil_format, **options)
+
+
+def build_page_derivatives(folder_path, filename, force=False):
+    """Write every derivative for one page image and return its manifest entry."""
+    from PIL import Image
+
+    src_path = os.path.join(folder_path, filename)
+    out_dir = derived_folder(folder_path)
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.splitext(filename)[0]
+
+    entry = {"thumbnail": None}
+    # Image.open only reads the header; pixels are decoded on first resize
+    with Image.open(src_path) as original:
+        image = original if original.mode in ("RGB", "L") else original.convert("RGB")
+        src_width = image.size[0]
+
+        for key, (pil_format, ext, options) in _supported_formats().items():
+            variants = {}
+            for target in WIDTHS:
+                if variants and max(map(int, variants)) >= src_width:
+                    # Never upscale; a full-size variant already exists
+                    break
+                width = min(target, src_width)
+                name = f"{base}-{width}.{ext}"
+                dst_path = os.path.join(out_dir, name)
+                if force or not _is_fresh(src_path, dst_path):
+                    _save_resized(image, width, dst_path, pil_format, options)
+                    print(f"[DERIVE] Wrote {dst_path}")
+                variants[str(width)] = name
+            entry[key] = variants
+
+        thumb_key = "webp" if "webp" in entry else "jpeg"
+        pil_format, ext, options = FORMATS[thumb_key]
+        thumb_name = f"{base}-thumb.{ext}"
+        thumb_path = os.path.join(out_dir, thumb_name)
+        if force or not _is_fresh(src_path, thumb_path):
+            _save_resized(image, THUMB_WIDTH, thumb_path, pil_format, options)
+            print(f"[DERIVE] Wrote {thumb_path}")
+        entry["thumbnail"] = thumb_name
+
+    return entry
+
+
+def build_chapter_derivatives(book, chapter, force=False):
+    """Generate derivatives for every page of a chapter and write its manifest."""
+    folder_path = os.path.join("static", "books", book, chapter)
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"Folder not found: {folder_path}")
+
+    manifest = {}
+    for file in sorted(os.listdir(folder_path)):
+        if not file.lower().endswith(IMAGE_EXTS):
+            continue
+        try:
+            manifest[file] = build_page_derivatives(folder_path, file, force=force)
+        except Exception as e:
+            print(f"[DERIVE] Failed for {file}: {e}")
+
+    manifest_path = os.path.join(derived_folder(folder_path), MANIFEST_FILE)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"[DERIVE] {len(manifest)} pages → {manifest_path}")
+    return manifest
+
+
+def page_sources(base_url, entry):
+    """Turn a manifest entry into URL maps (`sources`, `srcset`, `thumbnail`) for the API."""
+    if not entry:
+        return {}
+    derived_url = f"{base_url}/{DERIVED_DIR}"
+    result = {"sources": {}, "srcset": {}}
+    for key in FORMATS:
+        variants = entry.get(key) or {}
+        if not variants:
+            continue
+        urls = {width: f"{derived_url}/{name}" for width, name in variants.items()}
+        result["sources"][key] = urls
+        result["srcset"][key] = ", ".join(
+            f"{url} {width}w" for width, url in sorted(urls.items(), key=lambda kv: int(kv[0]))
+        )
+    if entry.get("thumbnail"):
+        result["thumbnail"] = f"{derived_url}/{entry['thumbnail']}"
+    return result
+
+
+if __name__ == "__main__":
+    # python image_derivatives.py [<book> [<chapter> ...]] [--force]
+    # With no book, every chapter under static/books is processed.
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    force = "--force" in sys.argv
+    books_root = os.path.join("static", "books")
+
+    books = args[:1] or sorted(
+        b for b in os.listdir(books_root) if os.path.isdir(os.path.join(books_root, b))
+    )
+    for book in books:
+        book_path = os.path.join(books_root, book)
+        chapters = args[1:] or sorted(
+            c for c in os.listdir(book_path) if os.path.isdir(os.path.join(book_path, c))
+        )
+        for chapter in chapters:
+            build_chapter_derivatives(book, chapter, force=force)
@@ -0,0 +1,190 @@
+from bisect import bisect_left, bisect_right
+
+# ────────────────────────────────────────────────
+# In-memory interval index over highlight spans.
+# One PageIntervalIndex per page keeps highlights sorted by
+# start offset with an implicit max-end tree on top, so
+# "which highlights overlap [start, end)" only visits the
+# branches that can contain a hit instead of the whole page.
+# ────────────────────────────────────────────────
+
+
+def _span(h):
+    return int(h["start"]), int(h["end"])
+
+
+def _merge(spans):
+    """Union of overlapping same-category spans; metadata comes from the longest one."""
+    spans = sorted(spans, key=_span)
+    base = dict(max(spans, key=lambda h: (h["end"] - h["start"], -h["start"])))
+
+    text = spans[0]["text"]
+    cur_end = spans[0]["end"]
+    for h in spans[1:]:
+        if h["end"] > cur_end:
+            text += h["text"][max(0, cur_end - h["start"]):]
+            cur_end = h["end"]
+
+    base["start"] = spans[0]["start"]
+    base["end"] = cur_end
+    base["text"] = text
+    return base
+
+
+class PageIntervalIndex:
+    """
+    Copy-on-write: every update builds new items/starts/tree lists and
+    publishes them with a single attribute assignment, so readers that
+    don't hold the highlight lock always see one consistent snapshot.
+    """
+
+    def __init__(self, highlights=()):
+        self._state = self._build(sorted(highlights, key=_span))
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __iter__(self):
+        return iter(self._state[0])
+
+    @staticmethod
+    def _build(items):
+        starts = [int(h["start"]) for h in items]
+        size = 1
+        while size < len(items):
+            size *= 2
+        # tree[node] = max end offset among the items under that node
+        tree = [-1] * (2 * size)
+        for i, h in enumerate(items):
+            tree[size + i] = int(h["end"])
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        return items, starts, size, tree
+
+    def overlapping(self, start, end):
+        """
+        Highlights overlapping the half-open range [start, end), in start order.
+        Cost is O(log n) to bound the candidates plus O(log n) per hit.
+        """
+        items, starts, size, tree = self._state
+        end = max(end, start + 1)
+        limit = bisect_left(starts, end)  # only items starting before `end`
+        if not limit:
+            return []
+
+        found = []
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or tree[node] <= start:
+                continue
+            if hi - lo == 1:
+                found.append(items[lo])
+                continue
+            mid = (lo + hi) // 2
+            # Right child first so the left side is popped (and reported) first
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def find(self, start, end, text=None, category=None):
+        """Exact-span lookup used by removal."""
+        items, starts, _, _ = self._state
+        lo = bisect_left(starts, start)
+        hi = bisect_right(starts, start)
+        for h in items[lo:hi]:
+            if int(h["end"]) != end:
+                continue
+            if text is not None and h.get("text") != text:
+                continue
+            if category is not None and h.get("category") != category:
+                continue
+            return h
+        return None
+
+    def insert(self, entry):
+        """
+        Add a span. A span already covered by one of the same category is
+        dropped (returns None); partial overlaps of the same category are
+        merged into a single span, which is returned.
+        """
+        start, end = _span(entry)
+        if (type(entry["start"]), type(entry["end"])) != (int, int):
+            entry = dict(entry, start=start, end=end)
+        same = [h for h in self.overlapping(entry["start"], entry["end"])
+                if h.get("category") == entry.get("category")]
+
+        for h in same:
+            if h["start"] <= entry["start"] and entry["end"] <= h["end"]:
+                return None
+
+        items = list(self._state[0])
+        if same:
+            ids = {id(h) for h in same}
+            items = [h for h in items if id(h) not in ids]
+            entry = _merge(same + [entry])
+
+        items.insert(bisect_right(items, _span(entry), key=_span), entry)
+        self._state = self._build(items)
+        return entry
+
+    def remove(self, entry):
+        items = self._state[0]
+        for i, h in enumerate(items):
+            if h is entry:
+                self._state = self._build(items[:i] + items[i + 1:])
+                return True
+        return False
+
+
+class ChapterHighlightIndex:
+    """Highlights of one chapter, bucketed into a PageIntervalIndex per page."""
+
+    def __init__(self, highlights=()):
+        buckets = {}
+        # Entries without usable offsets are kept (and saved back) but not
+        # indexed; they are still listed per page, but never match a range
+        self._unindexed = []
+        for h in highlights:
+            try:
+                page = int(h.get("page_number", 0))
+                start, end = _span(h)
+            except (TypeError, ValueError, KeyError, AttributeError):
+                self._unindexed.append(h)
+                continue
+            # Offsets saved by clients may be strings; the index compares ints
+            h["start"], h["end"] = start, end
+            buckets.setdefault(page, []).append(h)
+        self._pages = {page: PageIntervalIndex(items) for page, items in buckets.items()}
+
+    def page(self, page_number, create=False):
+        page_number = int(page_number)
+        index = self._pages.get(page_number)
+        if index is None and create:
+            index = PageIntervalIndex()
+            # Swap in a new dict so concurrent readers never iterate a resizing one
+            self._pages = {**self._pages, page_number: index}
+        return index
+
+    def pages(self):
+        pages = self._pages
+        return [pages[p] for p in sorted(pages)]
+
+    def unindexed(self, page_number=None):
+        """Entries without offsets, optionally only those on ``page_number``."""
+        if page_number is None:
+            return list(self._unindexed)
+        found = []
+        for h in self._unindexed:
+            try:
+                if int(h.get("page_number")) == int(page_number):
+                    found.append(h)
+            except (TypeError, ValueError, AttributeError):
+                continue
+        return found
+
+    def to_list(self):
+        return [h for page in self.pages() for h in page] + self._unindexed
+
+    def __len__(self):
+        return sum(len(p) for p in self.pages()) + len(self._unindexed)
@@ -0,0 +1,383 @@
+"""
+Local load-test harness reproducing classroom traffic.
+
+Copies the app into a scratch directory, starts it under gunicorn with
+gunicorn.conf.py, seeds the chapter's highlight file, then replays a
+traffic mix from many concurrent clients and reports throughput,
+latency percentiles, error rates and lost updates in the highlight file.
+
+    python loadtest.py --scenario mixed --clients 40 --duration 30
+    python loadtest.py --scenario burst --workers 4 --threads 8
+    python loadtest.py --url http://127.0.0.1:10000 --workdir .   # existing server
+
+Scenarios
+    readers  many students paging through a chapter (load, highlights, images)
+    burst    everyone presses auto-highlight at once, in synchronised rounds
+    edits    concurrent removals on one chapter's highlight file
+    mixed    readers + occasional auto-highlight + edits on the same chapter
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import urllib.parse
+
+SCENARIOS = {
+    "readers": {"load_chapter": 4, "chapter_highlights": 3, "image": 6},
+    "burst": {"highlight": 1},
+    "edits": {"remove_highlight": 3, "chapter_highlights": 1},
+    "mixed": {"load_chapter": 3, "chapter_highlights": 3, "image": 4, "highlight": 1, "remove_highlight": 2},
+}
+COPY_IGNORE = shutil.ignore_patterns(".git", "__pycache__", "profiles", "*.pyc")
+
+
+# ────────────────────────────────────────────────
+# Server lifecycle
+# ────────────────────────────────────────────────
+def start_server(workdir, port, args):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), GUNICORN_LOGLEVEL="warning")
+    if args.worker_class:
+        env["GUNICORN_WORKER_CLASS"] = args.worker_class
+    log = open(os.path.join(workdir, "loadtest-server.log"), "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited early; see {log.name}")
+        try:
+            status, _ = request("127.0.0.1", port, "GET", "/health", timeout=2)
+            if status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.3)
+    proc.terminate()
+    raise SystemExit("gunicorn did not become healthy within 60 s")
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ────────────────────────────────────────────────
+# HTTP
+# ────────────────────────────────────────────────
+def request(host, port, method, path, body=None, timeout=60):
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        conn.request(method, urllib.parse.quote(path, safe="/?=&"), body=payload, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+# ────────────────────────────────────────────────
+# Highlight file helpers
+# ────────────────────────────────────────────────
+def highlight_file(workdir, book, chapter):
+    return os.path.join(workdir, "static", "highlights", book, f"{chapter}.json")
+
+
+def read_highlights(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return data.get("highlights", []) if isinstance(data, dict) else data
+
+
+def seed_highlights(path, count):
+    """Non-overlapping synthetic highlights that the edit clients will remove."""
+    seeds = [{
+        "text": f"loadtest seed {i}",
+        "start": 100000 + i * 10,
+        "end": 100000 + i * 10 + 5,
+        "category": "date",
+        "page_number": 1,
+    } for i in range(count)]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(seeds, f, ensure_ascii=False, indent=2)
+    return seeds
+
+
+def _key(h):
+    return (h.get("text"), h.get("start"), h.get("end"), h.get("category"), h.get("page_number"))
+
+
+# ────────────────────────────────────────────────
+# Load generation
+# ────────────────────────────────────────────────
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # op -> [(latency_s, status)]
+
+    def add(self, op, latency, status):
+        with self._lock:
+            self.samples.setdefault(op, []).append((latency, status))
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class Client(threading.Thread):
+    def __init__(self, ctx, rng, barrier=None):
+        super().__init__(daemon=True)
+        self.ctx = ctx
+        self.rng = rng
+        self.barrier = barrier
+        ops, weights = zip(*SCENARIOS[ctx["scenario"]].items())
+        self.ops, self.weights = ops, weights
+
+    def run(self):
+        ctx = self.ctx
+        while time.time() < ctx["deadline"]:
+            if self.barrier is not None:
+                try:
+                    self.barrier.wait(timeout=max(0.1, ctx["deadline"] - time.time()))
+                except threading.BrokenBarrierError:
+                    return
+            op = self.rng.choices(self.ops, self.weights)[0]
+            self.perform(op)
+            if ctx["think"]:
+                time.sleep(self.rng.uniform(0, ctx["think"]))
+
+    def perform(self, op):
+        ctx = self.ctx
+        book, chapter = ctx["book"], ctx["chapter"]
+        method, path, body, seed = "GET", None, None, None
+
+        if op == "load_chapter":
+            method, path, body = "POST", "/api/load_chapter", {"book": book, "chapter": chapter}
+        elif op == "chapter_highlights":
+            page = self.rng.randint(1, max(1, ctx["pages"]))
+            path = f"/api/chapter_highlights/{book}/{chapter}?page_number={page}"
+        elif op == "image":
+            path = self.rng.choice(ctx["images"])
+        elif op == "highlight":
+            method, path = "POST", "/api/highlight"
+            body = {"book": book, "chapter": chapter, "category": self.rng.choice(ctx["categories"])}
+        elif op == "remove_highlight":
+            try:
+                seed = ctx["seeds"].get_nowait()
+            except queue.Empty:
+                op, path = "chapter_highlights", f"/api/chapter_highlights/{book}/{chapter}"
+            else:
+                method, path = "POST", "/api/remove_highlight"
+                body = dict(seed, book=book, chapter=chapter)
+
+        started = time.perf_counter()
+        try:
+            status, _ = request(ctx["host"], ctx["port"], method, path, body, timeout=ctx["timeout"])
+        except Exception:
+            status = 0
+        ctx["recorder"].add(op, time.perf_counter() - started, status)
+        if seed is not None and status == 200:
+            ctx["removed"].append(seed)
+
+
+def run_load(ctx, clients, seed):
+    barrier = threading.Barrier(clients) if ctx["scenario"] == "burst" else None
+    threads = [Client(ctx, random.Random(seed + i), barrier) for i in range(clients)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=max(1, ctx["deadline"] - time.time()) + ctx["timeout"])
+    if barrier is not None:
+        barrier.abort()
+    return time.time() - started
+
+
+# ────────────────────────────────────────────────
+# Reporting
+# ────────────────────────────────────────────────
+def report(recorder, elapsed, lost):
+    total = sum(len(v) for v in recorder.samples.values())
+    print(f"\n{'endpoint':<20} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print("-" * 78)
+    summary = {}
+    for op in sorted(recorder.samples):
+        samples = recorder.samples[op]
+        latencies = sorted(s[0] * 1000 for s in samples)
+        errors = sum(1 for _, status in samples if status == 0 or status >= 500)
+        row = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "error_rate": errors / len(samples),
+            "p50_ms": _percentile(latencies, 50),
+            "p90_ms": _percentile(latencies, 90),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": latencies[-1],
+        }
+        summary[op] = row
+        print(f"{op:<20} {row['requests']:>6} {row['rps']:>7.1f} {row['error_rate'] * 100:>5.1f}% "
+              f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    print("-" * 78)
+    print(f"{'total':<20} {total:>6} {total / elapsed if elapsed else 0:>7.1f}   over {elapsed:.1f} s")
+    print(f"\nLost updates: {lost['resurrected']} acknowledged removals reappeared, "
+          f"{lost['missing_additions']} auto-highlights missing "
+          f"(of {lost['removed']} removals / {lost['expected_additions']} expected additions)")
+    return {"elapsed_s": elapsed, "endpoints": summary, "lost_updates": lost}
+
+
+def check_lost_updates(ctx, workdir):
+    path = highlight_file(workdir, ctx["book"], ctx["chapter"])
+    final = read_highlights(path)
+    final_keys = {_key(h) for h in final}
+    resurrected = sum(1 for s in ctx["removed"] if _key(s) in final_keys)
+
+    expected = set()
+    if "highlight" in SCENARIOS[ctx["scenario"]]:
+        # Replay auto-highlight sequentially on an empty file: that's what
+        # the concurrent run should have produced on top of the seeds.
+        backup = path + ".loadtest"
+        had_file = os.path.exists(path)
+        if had_file:
+            shutil.copy(path, backup)
+            os.remove(path)
+        try:
+            for category in ctx["categories"]:
+                request(ctx["host"], ctx["port"], "POST", "/api/highlight",
+                        {"book": ctx["book"], "chapter": ctx["chapter"], "category": category},
+                        timeout=ctx["timeout"])
+            expected = {_key(h) for h in read_highlights(path)}
+        finally:
+            if had_file:
+                os.replace(backup, path)
+            elif os.path.exists(path):
+                # No file before the replay: the run ended with no highlights
+                os.remove(path)
+
+    seeds = {_key(s) for s in ctx["all_seeds"]}
+    missing = sum(1 for k in expected - seeds if k not in final_keys)
+    return {
+        "removed": len(ctx["removed"]),
+        "resurrected": resurrected,
+        "expected_additions": len(expected),
+        "missing_additions": missing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classroom traffic load test")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--think", type=float, default=0.0, help="max random pause between requests (s)")
+    parser.add_argument("--book", default="11th")
+    parser.add_argument("--chapter", default="Chapter 1")
+    parser.add_argument("--categories", default="date,pyq")
+    parser.add_argument("--seeds", type=int, default=200, help="highlights seeded for the edit clients")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--worker-class", default=None)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--url", default=None, help="use an already running server instead of starting gunicorn")
+    parser.add_argument("--workdir", default=None, help="app directory the server runs in (default: scratch copy)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch copy")
+    parser.add_argument("--json", default=None, help="also write the summary to this file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    scratch = None
+    if args.workdir:
+        workdir = os.path.abspath(args.workdir)
+    elif args.url:
+        workdir = here
+    else:
+        scratch = tempfile.mkdtemp(prefix="ncert-loadtest-")
+        workdir = os.path.join(scratch, "app")
+        shutil.copytree(here, workdir, ignore=COPY_IGNORE)
+
+    folder = os.path.join(workdir, "static", "books", args.book, args.chapter)
+    images = sorted(f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    derived = os.path.join(folder, "derived")
+    image_paths = [f"/static/books/{args.book}/{args.chapter}/{f}" for f in images]
+    if os.path.isdir(derived):
+        image_paths += [f"/static/books/{args.book}/{args.chapter}/derived/{f}"
+                        for f in sorted(os.listdir(derived)) if not f.endswith(".json")]
+
+    hl_path = highlight_file(workdir, args.book, args.chapter)
+    # Outside a scratch copy the real highlight file is restored afterwards
+    restore = scratch is None
+    original = open(hl_path, "rb").read() if restore and os.path.exists(hl_path) else None
+    seeds = seed_highlights(hl_path, args.seeds) if "remove_highlight" in SCENARIOS[args.scenario] else []
+    seed_queue = queue.Queue()
+    for s in random.Random(args.seed).sample(seeds, len(seeds)):
+        seed_queue.put(s)
+
+    proc = None
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        print(f"Starting gunicorn in {workdir} (workers={args.workers}, threads={args.threads}) ...")
+        proc = start_server(workdir, port, args)
+
+    ctx = {
+        "scenario": args.scenario, "host": host, "port": port, "timeout": args.timeout,
+        "book": args.book, "chapter": args.chapter, "pages": len(images), "images": image_paths,
+        "categories": [c.strip() for c in args.categories.split(",") if c.strip()],
+        "seeds": seed_queue, "all_seeds": seeds, "removed": [], "think": args.think,
+        "recorder": Recorder(), "deadline": time.time() + args.duration,
+    }
+
+    try:
+        print(f"Running '{args.scenario}' with {args.clients} clients for {args.duration:.0f} s ...")
+        elapsed = run_load(ctx, args.clients, args.seed)
+        lost = check_lost_updates(ctx, workdir)
+        summary = report(ctx["recorder"], elapsed, lost)
+        summary.update(scenario=args.scenario, clients=args.clients,
+                       workers=args.workers, threads=args.threads)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if restore and original is not None:
+            with open(hl_path, "wb") as f:
+                f.write(original)
+        elif restore and os.path.exists(hl_path):
+            os.remove(hl_path)
+        if scratch and not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+        elif scratch:
+            print(f"Scratch copy kept at {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,44 @@
-from PIL import Image
-import pytesseract
 import os
 import re
+import math
+import time
+from bisect import bisect_left
 
-try:
-    RESAMPLE = Image.Resampling.LANCZOS
-except AttributeError:
-    RESAMPLE = Image.ANTIALIAS
+# PIL and pytesseract are imported on first use so that read-only API
+# workers importing this module don't pay for them at startup.
+_Image = None
+_pytesseract = None
+
+
+def _pil_image():
+    global _Image
+    if _Image is None:
+        from PIL import Image
+        _Image = Image
+    return _Image
+
+
+def _tesseract():
+    global _pytesseract
+    if _pytesseract is None:
+        import pytesseract
+        _pytesseract = pytesseract
+    return _pytesseract
+
+
+def _resample_filter():
+    Image = _pil_image()
+    try:
+        return Image.Resampling.LANCZOS
+    except AttributeError:
+        return Image.ANTIALIAS
+
+
+def __getattr__(name):
+    # Keeps `from ocr_engine import RESAMPLE` working without an eager PIL import
+    if name == "RESAMPLE":
+        return _resample_filter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def clean_ocr_text(text):
     """
@@ -35,7 +67,307 @@ def clean_ocr_text(text):
 
     return "\n".join(cleaned_lines)
 
-def extract_text_from_image(image_path, lang='eng'):
+# Preprocessing defaults; pass a dict to extract_text_from_image(preprocess=...)
+# to override individual keys, or preprocess=False to feed the raw scan.
+OCR_PREPROCESS = {
+    "grayscale": True,
+    "target_dpi": 300,        # downscale scans above this DPI
+    "assumed_dpi": 300,       # used when the file carries no DPI metadata
+    "max_side": 3500,         # hard cap on the longest side, in pixels
+    "binarize": True,
+    "deskew": True,
+    "max_skew_degrees": 5.0,
+    "skew_step": 0.5,
+    "blank_ink_ratio": 0.002, # pages with less dark ink than this are skipped
+    "blank_min_contrast": 60, # "ink" = this many gray levels darker than the paper
+}
+
+def _otsu_threshold(gray):
+    """Otsu threshold for an 'L' image, computed from its histogram."""
+    hist = gray.histogram()[:256]
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    sum_bg = weight_bg = 0
+    best_t, best_var = 127, -1.0
+    for t in range(256):
+        weight_bg += hist[t]
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * hist[t]
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if var > best_var:
+            best_t, best_var = t, var
+    return best_t
+
+def _ink_ratio(gray, min_contrast):
+    """
+    Fraction of pixels at least ``min_contrast`` levels darker than the
+    paper (the median gray level). Measured before binarisation: Otsu
+    always splits a histogram in two, even on an empty, noisy page.
+    """
+    hist = gray.histogram()[:256]
+    total = sum(hist)
+    if not total:
+        return 0.0
+    seen, paper = 0, 255
+    for level, count in enumerate(hist):
+        seen += count
+        if seen * 2 >= total:
+            paper = level
+            break
+    cutoff = paper - min_contrast
+    return sum(hist[:max(0, cutoff)]) / float(total)
+
+def _estimate_skew(binary, max_degrees, step):
+    """
+    Projection-profile skew estimate: the angle whose rotated row
+    profile has the highest variance (text lines snap to rows).
+    """
+    Image = _pil_image()
+    # Work on a small copy; the angle doesn't depend on resolution
+    small = binary.copy()
+    small.thumbnail((1000, 1000), Image.NEAREST)
+    inverted = small.point(lambda p: 255 - p)
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_degrees / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = inverted.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        # Shrinking to 1px wide with BOX averages every row
+        rows = list(rotated.resize((1, rotated.size[1]), Image.BOX).getdata())
+        mean = sum(rows) / len(rows)
+        score = sum((r - mean) ** 2 for r in rows)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+def preprocess_image(image, options=None):
+    """
+    Prepare a page scan for tesseract. Returns (image, is_blank).
+    """
+    image, is_blank, _ = _preprocess(image, options)
+    return image, is_blank
+
+def _preprocess(image, options=None):
+    """
+    preprocess_image plus the geometry needed to map pixel
+    coordinates back onto the source scan.
+    """
+    opts = dict(OCR_PREPROCESS, **(options or {}))
+    Image = _pil_image()
+    geometry = {"source_size": image.size, "scale": 1.0, "angle": 0.0}
+
+    if opts["grayscale"] or opts["binarize"]:
+        image = image.convert("L")
+
+    # DPI-aware downscale
+    dpi = image.info.get("dpi", (opts["assumed_dpi"],))[0] or opts["assumed_dpi"]
+    scale = min(1.0, opts["target_dpi"] / float(dpi))
+    longest = max(image.size)
+    if opts["max_side"] and longest * scale > opts["max_side"]:
+        scale = opts["max_side"] / float(longest)
+    if scale < 1.0:
+        new_size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        image = image.resize(new_size, _resample_filter())
+        geometry["scale"] = image.size[0] / float(geometry["source_size"][0])
+        print(f"📉 Downscaled to {image.size} (source {dpi} DPI)")
+    geometry["unrotated_size"] = image.size
+
+    gray = image if image.mode == "L" else image.convert("L")
+    ink = _ink_ratio(gray, opts["blank_min_contrast"])
+    is_blank = ink < opts["blank_ink_ratio"]
+    print(f"⚫ Ink ratio {ink:.4f}{' (blank)' if is_blank else ''}")
+    if is_blank:
+        return image, is_blank, geometry
+
+    if opts["binarize"]:
+        threshold = _otsu_threshold(image)
+        image = image.point(lambda p: 255 if p > threshold else 0)
+        print(f"⚫ Binarised at {threshold}")
+
+        if opts["deskew"]:
+            angle = _estimate_skew(image, opts["max_skew_degrees"], opts["skew_step"])
+            if angle:
+                image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+                geometry["angle"] = angle
+                print(f"📐 Deskewed by {angle}°")
+
+    return image, is_blank, geometry
+
+def _to_source_box(box, image_size, geometry):
+    """
+    Map a (left, top, width, height) box found on the preprocessed
+    image back to pixel coordinates on the original scan.
+    """
+    left, top, width, height = box
+    corners = [(left, top), (left + width, top), (left, top + height), (left + width, top + height)]
+
+    theta = math.radians(geometry["angle"])
+    cos_t, sin_t = math.cos(theta), math.sin(theta)
+    cx, cy = image_size[0] / 2.0, image_size[1] / 2.0
+    ux, uy = geometry["unrotated_size"][0] / 2.0, geometry["unrotated_size"][1] / 2.0
+    scale = geometry["scale"] or 1.0
+
+    xs, ys = [], []
+    for x, y in corners:
+        dx, dy = x - cx, y - cy
+        # Undo the deskew rotation, then the downscale
+        xs.append((dx * cos_t - dy * sin_t + ux) / scale)
+        ys.append((dx * sin_t + dy * cos_t + uy) / scale)
+
+    sw, sh = geometry["source_size"]
+    x0, y0 = max(0, int(min(xs))), max(0, int(min(ys)))
+    x1, y1 = min(sw, int(math.ceil(max(xs)))), min(sh, int(math.ceil(max(ys))))
+    return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+_WORD = re.compile(r"\w+")
+
+def _word_pieces(word):
+    return [piece.casefold() for piece in _WORD.findall(word)]
+
+def align_words(text, words, window=16, anchor=2):
+    """
+    Map OCR words onto character offsets of ``text``. Words are compared
+    case-folded on word boundaries (punctuation and markup around them is
+    ignored). Each word is looked for in the next ``window`` text words
+    after the cursor; if it isn't there (e.g. the stored text has a long
+    run OCR never saw, like an HTML <head>), the rest of the text is
+    searched for a spot where it and the next ``anchor`` OCR words match
+    in a row, and the cursor resyncs there.
+    Returns rows of (char_start, char_end, left, top, width, height).
+    """
+    tokens = [(m.group().casefold(), m.start(), m.end()) for m in _WORD.finditer(text)]
+    positions = {}
+    for idx, (token, _, _) in enumerate(tokens):
+        positions.setdefault(token, []).append(idx)
+
+    items = [(pieces, box) for pieces, box in ((_word_pieces(w), b) for w, b in words) if pieces]
+
+    def matches_at(pieces, idx):
+        return all(idx + k < len(tokens) and tokens[idx + k][0] == piece
+                   for k, piece in enumerate(pieces))
+
+    def follows(item_index, idx):
+        # The next `anchor` OCR words continue the match right after idx
+        for pieces, _ in items[item_index + 1:item_index + 1 + anchor]:
+            if not matches_at(pieces, idx):
+                return False
+            idx += len(pieces)
+        return True
+
+    rows = []
+    cursor = 0
+    for n, (pieces, box) in enumerate(items):
+        found = None
+        for idx in range(cursor, min(len(tokens), cursor + window)):
+            if matches_at(pieces, idx):
+                found = idx
+                break
+        if found is None:
+            candidates = positions.get(pieces[0], [])
+            for idx in candidates[bisect_left(candidates, cursor):]:
+                if matches_at(pieces, idx) and follows(n, idx + len(pieces)):
+                    found = idx
+                    break
+        if found is None:
+            continue
+        last = found + len(pieces) - 1
+        rows.append((tokens[found][1], tokens[last][2]) + tuple(box))
+        cursor = last + 1
+    return rows
+
+def _text_from_data(data):
+    """
+    Rebuild page text from image_to_data output (one line per
+    block/paragraph/line, blank line between paragraphs), so a page
+    only goes through recognition once.
+    """
+    lines = []
+    current, key, par = [], None, None
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        if not word:
+            continue
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if line_key != key:
+            if current:
+                lines.append(" ".join(current))
+            if par is not None and line_key[:2] != par:
+                lines.append("")
+            current, key, par = [], line_key, line_key[:2]
+        current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return "\n".join(lines)
+
+def extract_words_from_image(image_path, lang='eng', preprocess=True):
+    """
+    Run tesseract once and return (raw_text, words, source_size), where
+    words is a list of (word, (left, top, width, height)) in reading
+    order with boxes in the original image's pixel coordinates.
+    """
+    tess = _tesseract()
+    config = '--psm 6'
+
+    with _pil_image().open(image_path) as original:
+        source_size = original.size
+        geometry = {"source_size": source_size, "scale": 1.0, "angle": 0.0,
+                    "unrotated_size": source_size}
+        image = original
+        if preprocess:
+            image, is_blank, geometry = _preprocess(original, preprocess if isinstance(preprocess, dict) else None)
+            if is_blank:
+                print(f"⬜ Blank page, skipping OCR: {image_path}")
+                return "", [], source_size
+
+        started = time.perf_counter()
+        data = tess.image_to_data(image, lang=lang, config=config, output_type=tess.Output.DICT)
+        print(f"⏱️ Recognition + layout took {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    raw_text = _text_from_data(data)
+
+    words = []
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        if not word or str(data["conf"][i]) == "-1":
+            continue
+        box = (data["left"][i], data["top"][i], data["width"][i], data["height"][i])
+        words.append((word, _to_source_box(box, image.size, geometry)))
+    return raw_text, words, source_size
+
+def ingest_page(image_path, lang='eng', preprocess=True, keep_existing_text=True):
+    """
+    OCR one page image and write pageN.boxes next to it. If pageN.txt
+    already exists (and keep_existing_text), boxes are aligned to that
+    text so stored highlight offsets stay valid; otherwise the cleaned
+    OCR text is written to pageN.txt too.
+    """
+    from page_boxes import boxes_path, write_boxes
+
+    txt_path = os.path.splitext(image_path)[0] + ".txt"
+    raw_text, words, source_size = extract_words_from_image(image_path, lang, preprocess)
+
+    if keep_existing_text and os.path.exists(txt_path):
+        with open(txt_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = clean_ocr_text(raw_text).strip()
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"📝 Saved OCR text → {txt_path}")
+
+    rows = align_words(text, words)
+    print(f"🔗 Aligned {len(rows)}/{len(words)} OCR words to text offsets")
+    write_boxes(boxes_path(image_path), source_size, rows)
+    return text, rows
+
+def extract_text_from_image(image_path, lang='eng', preprocess=True):
     try:
         print(f"🔍 OCR START: {image_path}")
 
@@ -43,13 +375,23 @@ def extract_text_from_image(image_path, lang='eng'):
             print(f"❌ File not found: {image_path}")
             return ""
 
-        image = Image.open(image_path)
+        image = _pil_image().open(image_path)
 
         print(f"📐 Image size: {image.size}")
         print(f"🔤 OCR language: {lang}")
 
+        if preprocess:
+            started = time.perf_counter()
+            image, is_blank = preprocess_image(image, preprocess if isinstance(preprocess, dict) else None)
+            print(f"🧹 Preprocessed in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if is_blank:
+                print(f"⬜ Blank page, skipping OCR: {image_path}")
+                return ""
+
         config = '--psm 6'
-        text = pytesseract.image_to_string(image, lang=lang, config=config)
+        started = time.perf_counter()
+        text = _tesseract().image_to_string(image, lang=lang, config=config)
+        print(f"⏱️ Recognition took {(time.perf_counter() - started) * 1000:.0f} ms")
 
         # Clean junk HTML or code-like content
         cleaned_text = clean_ocr_text(text)
@@ -63,9 +405,44 @@ def extract_text_from_image(image_path, lang='eng'):
         print(f"❌ OCR failed for {image_path}: {e}")
         return ""
 
+def compare_preprocessing(image_path, lang='eng', options=None):
+    """
+    Run tesseract on the raw scan and on the preprocessed one and
+    report both recognition times (ms) plus output lengths.
+    """
+    Image = _pil_image()
+    tess = _tesseract()
+    config = '--psm 6'
 
+    with Image.open(image_path) as raw:
+        started = time.perf_counter()
+        raw_text = tess.image_to_string(raw, lang=lang, config=config)
+        raw_ms = (time.perf_counter() - started) * 1000
 
+        started = time.perf_counter()
+        prepared, is_blank = preprocess_image(raw, options)
+        prep_ms = (time.perf_counter() - started) * 1000
 
+    started = time.perf_counter()
+    prepared_text = "" if is_blank else tess.image_to_string(prepared, lang=lang, config=config)
+    prepared_ms = (time.perf_counter() - started) * 1000
 
+    result = {
+        "image": image_path,
+        "raw_ms": round(raw_ms, 1),
+        "preprocess_ms": round(prep_ms, 1),
+        "preprocessed_ms": round(prepared_ms, 1),
+        "blank": is_blank,
+        "raw_chars": len(clean_ocr_text(raw_text)),
+        "preprocessed_chars": len(clean_ocr_text(prepared_text)),
+    }
+    print(f"⏱️ OCR {image_path}: raw {result['raw_ms']} ms → "
+          f"preprocessed {result['preprocess_ms']} + {result['preprocessed_ms']} ms")
+    return result
 
 
+if __name__ == "__main__":
+    # python ocr_engine.py page1.jpg [page2.jpg ...] — before/after timings
+    import sys
+    for path in sys.argv[1:]:
+        compare_preprocessing(path)
@@ -0,0 +1,99 @@
+import os
+import sys
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+import chapter_cache
+
+# ────────────────────────────────────────────────
+# Per-page word boxes: pageN.boxes next to pageN.txt.
+# Binary layout (little-endian):
+#   header  magic "NCBX", version, fields, image width, image height, count
+#   body    int32 x (count * FIELDS):
+#           char_start, char_end, left, top, width, height
+# Rows are in text order, so both char_start and char_end are
+# sorted and a highlight's words are found with two bisects.
+# Pixel coordinates refer to the original pageN.jpg.
+# ────────────────────────────────────────────────
+MAGIC = b"NCBX"
+VERSION = 1
+FIELDS = 6
+_HEADER = struct.Struct("<4sHHIII")
+
+
+def boxes_path(page_path):
+    """pageN.jpg / pageN.txt → pageN.boxes"""
+    return os.path.splitext(page_path)[0] + ".boxes"
+
+
+def write_boxes(path, image_size, words):
+    """Write word rows (char_start, char_end, left, top, width, height) to ``path``."""
+    data = array("i")
+    for row in words:
+        data.extend(int(v) for v in row)
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    count = len(data) // FIELDS
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, FIELDS, image_size[0], image_size[1], count))
+        f.write(data.tobytes())
+    os.replace(tmp_path, path)
+    print(f"📦 Saved {count} word boxes → {path}")
+    return count
+
+
+class PageBoxes:
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self._data = data
+        self._starts = data[0::FIELDS]
+        self._ends = data[1::FIELDS]
+
+    def __len__(self):
+        return len(self._starts)
+
+    def words_in(self, start, end):
+        """Word rows overlapping the character range [start, end)."""
+        lo = bisect_right(self._ends, start)
+        hi = bisect_left(self._starts, end)
+        return [tuple(self._data[i * FIELDS:(i + 1) * FIELDS]) for i in range(lo, hi)]
+
+    def rects_for(self, start, end):
+        """
+        Pixel rectangles [left, top, width, height] covering a highlight,
+        with consecutive words on the same line joined into one rect.
+        """
+        rects = []
+        for _, _, left, top, width, height in self.words_in(start, end):
+            if rects:
+                r = rects[-1]
+                r_bottom = r[1] + r[3]
+                center = top + height / 2
+                if r[1] <= center <= r_bottom and left >= r[0]:
+                    right = max(r[0] + r[2], left + width)
+                    bottom = max(r_bottom, top + height)
+                    r[1] = min(r[1], top)
+                    r[2] = right - r[0]
+                    r[3] = bottom - r[1]
+                    continue
+            rects.append([left, top, width, height])
+        return rects
+
+
+def parse_boxes(raw):
+    magic, version, fields, width, height, count = _HEADER.unpack_from(raw)
+    if magic != MAGIC or version != VERSION or fields != FIELDS:
+        raise ValueError("Not a word-box file")
+    data = array("i")
+    data.frombytes(raw[_HEADER.size:_HEADER.size + count * fields * data.itemsize])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return PageBoxes(width, height, data)
+
+
+def load_boxes(path):
+    """Cached PageBoxes for ``path`` or None if missing/unreadable."""
+    return chapter_cache.read_parsed(path, parse_boxes)
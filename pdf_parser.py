@@ -1,4 +1,7 @@
-def extract_text_from_chapter(book, chapter, only_images=None):
+import os
+from ocr_engine import extract_text_from_image, ingest_page
+
+def extract_text_from_chapter(book, chapter, only_images=None, preprocess=True):
     folder_path = os.path.join("static", "books", book, chapter)
     print(f"📂 Extracting text from folder: {folder_path}")
 
@@ -20,11 +23,33 @@ def extract_text_from_chapter(book, chapter, only_images=None):
             image_path = os.path.join(folder_path, file)
             print(f"🔍 OCR on image: {image_path}")
             try:
-                text = extract_text_from_image(image_path)
-                text_chunks.append(text)
+                text = extract_text_from_image(image_path, preprocess=preprocess)
+                if text:
+                    text_chunks.append(text)
             except Exception as e:
                 print(f"❌ OCR failed for {file}: {e}")
 
     full_text = "\n".join(text_chunks)
     print(f"📝 Total text length: {len(full_text)} characters")
     return full_text
+
+
+def ingest_chapter_boxes(book, chapter, preprocess=True):
+    """
+    OCR every page image of a chapter and write pageN.boxes (and
+    pageN.txt where missing) so highlights can be mapped to pixels.
+    """
+    folder_path = os.path.join("static", "books", book, chapter)
+    if not os.path.exists(folder_path):
+        raise FileNotFoundError(f"❌ Folder not found: {folder_path}")
+
+    pages = 0
+    for file in sorted(os.listdir(folder_path)):
+        if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+            try:
+                ingest_page(os.path.join(folder_path, file), preprocess=preprocess)
+                pages += 1
+            except Exception as e:
+                print(f"❌ Box ingest failed for {file}: {e}")
+    print(f"📦 Word boxes written for {pages} pages")
+    return pages
@@ -1,13 +1,30 @@
-import json
+import chapter_cache
+from fuzzy_match import build_index
 
 def load_pyqs():
-    with open('pyqs_data.json') as f:
-        return json.load(f)
+    return chapter_cache.read_json('pyqs_data.json', default=[])
 
-def get_pyq_matches(chapter_text):
+def get_pyq_matches(chapter_text, fuzzy=False):
     pyqs = load_pyqs()
+    if fuzzy:
+        return get_fuzzy_pyq_matches(chapter_text, pyqs)
     matches = []
     for q in pyqs:
         if q['keyword'].lower() in chapter_text.lower():
             matches.append(q)
     return matches
+
+def get_fuzzy_pyq_matches(chapter_text, pyqs=None):
+    """Like get_pyq_matches, but tolerant of OCR typos; adds offsets and a score."""
+    pyqs = load_pyqs() if pyqs is None else pyqs
+    index = build_index([q['keyword'] for q in pyqs])
+    by_keyword = {q['keyword']: q for q in pyqs}
+    matches = []
+    seen = set()
+    for m in index.search(chapter_text):
+        if m['phrase'] in seen:
+            continue
+        seen.add(m['phrase'])
+        matches.append(dict(by_keyword[m['phrase']], match=m['text'], start=m['start'],
+                            end=m['end'], score=m['score']))
+    return matches
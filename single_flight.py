@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: in-process coalescing only
+    fcntl = None
+
+# ────────────────────────────────────────────────
+# Single-flight request coalescing.
+# Concurrent calls with the same key share one computation:
+#   - within a worker, followers wait on the leader's Future;
+#   - across gunicorn workers, leaders serialise on a flock()ed
+#     lock file and publish their result next to it, so a worker
+#     that was queued behind the lock reuses that result instead
+#     of recomputing it.
+# ────────────────────────────────────────────────
+LOCK_DIR = os.environ.get(
+    "SINGLE_FLIGHT_DIR", os.path.join(tempfile.gettempdir(), "ncert-single-flight")
+)
+
+
+class SingleFlight:
+    def __init__(self, name, cross_process=False):
+        self.name = name
+        self.cross_process = cross_process and fcntl is not None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run ``fn()`` for ``key`` unless an identical call is already in
+        flight, in which case wait for and return its result. With
+        ``cross_process`` the result must be JSON-serialisable.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            print(f"[SINGLE FLIGHT] {self.name}: joined in-flight call for {key}")
+            return future.result()
+
+        try:
+            result = self._run_shared(key, fn) if self.cross_process else fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _paths(self, key):
+        digest = hashlib.sha1(f"{self.name}|{key!r}".encode("utf-8")).hexdigest()
+        base = os.path.join(LOCK_DIR, digest)
+        return base + ".lock", base + ".json"
+
+    def _run_shared(self, key, fn):
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        lock_path, result_path = self._paths(key)
+        requested_at = time.time()
+
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                shared = _read_result(result_path)
+                # A result finished after we arrived was computed for us too
+                if shared is not None and shared["finished_at"] >= requested_at:
+                    print(f"[SINGLE FLIGHT] {self.name}: reused result from pid {shared['pid']} for {key}")
+                    return shared["result"]
+
+                result = fn()
+                _write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_result(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_result(path, result):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "finished_at": time.time(), "result": result}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[SINGLE FLIGHT] Could not publish result to {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,64 @@
+import os
+import re
+from html.parser import HTMLParser
+import pytest
+from ocr_engine import align_words
+
+CHAPTER = os.path.join("static", "books", "11th", "Chapter 1")
+
+
+class _VisibleText(HTMLParser):
+    """Words a scan of the rendered page would show (no <head>, <style>, <script>)."""
+
+    def __init__(self):
+        super().__init__()
+        self.hidden = 0
+        self.words = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("head", "style", "script"):
+            self.hidden += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("head", "style", "script"):
+            self.hidden -= 1
+
+    def handle_data(self, data):
+        if not self.hidden:
+            self.words.extend(data.split())
+
+
+def _page(name):
+    with open(os.path.join(CHAPTER, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", ["page3.txt", "page8.txt"])
+def test_aligns_visible_words_of_html_page(name):
+    text = _page(name)
+    parser = _VisibleText()
+    parser.feed(text)
+    visible = [w for w in parser.words if re.search(r"\w", w)]
+    # box.left carries the word's position so each row can be checked
+    words = [(w, (i, 0, 10, 10)) for i, w in enumerate(visible)]
+
+    rows = align_words(text, words)
+
+    assert len(rows) >= 0.95 * len(words)
+    for start, end, left, *_ in rows:
+        core = " ".join(re.findall(r"\w+", words[left][0]))
+        assert " ".join(re.findall(r"\w+", text[start:end])).casefold() == core.casefold()
+
+
+def test_resyncs_after_text_ocr_never_saw():
+    text = "Intro. " + "filler " * 200 + "Living World, the end."
+    words = [("Intro.", (0, 0, 1, 1)), ("LIVING", (1, 0, 1, 1)), ("world", (2, 0, 1, 1)), ("the", (3, 0, 1, 1))]
+
+    rows = align_words(text, words)
+
+    assert [text[r[0]:r[1]] for r in rows] == ["Intro", "Living", "World", "the"]
+
+
+def test_matches_on_word_boundaries():
+    rows = align_words("other the", [("the", (0, 0, 1, 1))])
+    assert [r[0] for r in rows] == [6]
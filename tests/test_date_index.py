@@ -0,0 +1,21 @@
+import pytest
+from date_index import DateIndex, INDEX_VERSION, parse_date
+
+
+def _index():
+    return DateIndex({"version": INDEX_VERSION, "entries": [], "years": {}, "months": {}})
+
+
+@pytest.mark.parametrize("bad", ["2020-13", "2020-00", "2020-02-30", "2020-01-00"])
+def test_query_rejects_impossible_dates(bad):
+    with pytest.raises(ValueError):
+        _index().query(bad, None)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1/2/195", None),
+    ("1/2/95", ("1995-02-01", "day")),
+    ("01/02/2025", ("2025-02-01", "day")),
+])
+def test_numeric_dates_need_two_or_four_digit_years(text, expected):
+    assert parse_date(text) == expected
@@ -0,0 +1,28 @@
+from interval_index import ChapterHighlightIndex
+
+
+def _entry(start, end, text, category="date", page_number=1):
+    return {"text": text, "start": start, "end": end, "category": category, "page_number": page_number}
+
+
+def test_string_offsets_from_clients_are_indexed_as_ints():
+    index = ChapterHighlightIndex([_entry("8", "14", "July 1")])
+
+    stored = index.page(1).insert(_entry(10, 20, "y 1904 abcd"))
+
+    assert (stored["start"], stored["end"]) == (8, 20)
+    assert [(h["start"], h["end"]) for h in index.to_list()] == [(8, 20)]
+
+
+def test_covered_span_with_string_offsets_is_dropped():
+    index = ChapterHighlightIndex([_entry(0, 30, "a long highlighted sentence...")])
+
+    assert index.page(1).insert(_entry("5", "10", "ghted")) is None
+    assert len(index) == 1
+
+
+def test_legacy_rows_without_offsets_stay_on_their_page():
+    index = ChapterHighlightIndex([{"text": "legacy", "category": "date", "page_number": 2}])
+
+    assert index.unindexed(2) == [{"text": "legacy", "category": "date", "page_number": 2}]
+    assert index.unindexed(3) == []
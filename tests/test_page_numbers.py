@@ -0,0 +1,17 @@
+import os
+from highlighter import page_image_path, _list_chapter_pages
+
+
+def test_page_numbers_follow_sorted_image_names(tmp_path):
+    for n in range(1, 12):
+        (tmp_path / f"page{n}.jpg").write_bytes(b"")
+        (tmp_path / f"page{n}.txt").write_text("", encoding="utf-8")
+
+    folder = str(tmp_path)
+    numbered = dict(_list_chapter_pages(folder))
+
+    # Same listing on both sides: page_number 2 is page10
+    assert os.path.basename(page_image_path(folder, 2)) == "page10.jpg"
+    assert numbered[2].endswith("page10.txt")
+    assert page_image_path(folder, 12) is None
+    assert page_image_path(str(tmp_path / "missing"), 1) is None